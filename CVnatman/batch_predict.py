@@ -0,0 +1,258 @@
+# batch_predict.py
+"""
+Пакетное распознавание статуй по папкам с фото (например, выгрузка фото игроков).
+
+- Файлы находятся одним обходом os.scandir, без перебора имен и расширений.
+- Декодирование, уменьшение и нормализация - в пуле процессов через
+  InferenceCore.load_into, ту же предобработку, что у сервера и обучения.
+- Модель получает большие батчи; результаты пишутся потоком в JSONL или Parquet
+  после каждого батча, поэтому прерванный запуск продолжается с того же места.
+  Файлы, которые не удалось прочитать, записываются с ошибкой и при следующем
+  запуске пробуются снова.
+
+    python batch_predict.py submissions/ --output results.jsonl
+    python batch_predict.py a/ b/ --output results.parquet --backend tflite --batch-size 256
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from statue_inference import IMAGE_SIZE, InferenceCore, load_backend, top_k
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+DECODE_CHUNK = 32  # изображений на одну задачу пула декодирования
+
+_decoder = None
+
+
+def scan_images(roots):
+    """Все изображения в папках (рекурсивно) одним обходом os.scandir, в стабильном порядке"""
+    paths = []
+    stack = list(roots)
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError as e:
+            print(f"   ⚠️ Пропущена папка {directory}: {e}")
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(entry.path)
+    paths.sort()
+    return paths
+
+
+def decode_chunk(paths, target_size=IMAGE_SIZE):
+    """Выполняется в процессе пула: пути -> (float32 батч, ошибки по индексу)"""
+    global _decoder
+    if _decoder is None or _decoder.img_size != tuple(target_size):
+        # Процессу пула нужна только предобработка ядра, без модели
+        _decoder = InferenceCore(None, (), target_size)
+    images = np.empty((len(paths), target_size[1], target_size[0], 3), dtype=np.float32)
+    errors = {}
+    for i, path in enumerate(paths):
+        try:
+            _decoder.load_into(path, images[i])
+        except Exception as e:
+            errors[i] = str(e)
+    return images, errors
+
+
+class JsonlWriter:
+    def __init__(self, path):
+        self.path = path
+
+    def done_paths(self):
+        """
+        Пути, успешно распознанные прошлым запуском (записи с ошибкой пробуются снова);
+        оборванная последняя строка отрезается
+        """
+        done = set()
+        if not os.path.exists(self.path):
+            return done
+        valid_bytes = 0
+        last_line = b''
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    path = record['path']
+                except (ValueError, KeyError):
+                    break
+                if 'error' in record:
+                    done.discard(path)
+                else:
+                    done.add(path)
+                valid_bytes += len(line)
+                last_line = line
+        with open(self.path, 'r+b') as f:
+            f.truncate(valid_bytes)
+            if last_line and not last_line.endswith(b'\n'):
+                # Последняя запись целая, но без перевода строки - иначе следующая допишется к ней
+                f.seek(valid_bytes)
+                f.write(b'\n')
+        return done
+
+    def write(self, records):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class ParquetWriter:
+    """Папка с частями part-NNNNN.parquet: каждая часть - один записанный батч"""
+
+    def __init__(self, path):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("❌ Для Parquet нужен pyarrow: pip install pyarrow")
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.parts = sorted(name for name in os.listdir(path) if name.endswith('.parquet'))
+
+    def done_paths(self):
+        """Пути, успешно распознанные прошлым запуском; записи с ошибкой пробуются снова"""
+        import pyarrow.parquet as pq
+        done = set()
+        for name in self.parts:
+            table = pq.read_table(os.path.join(self.path, name), columns=['path', 'error'])
+            for path, error in zip(table.column('path').to_pylist(), table.column('error').to_pylist()):
+                if error is None:
+                    done.add(path)
+                else:
+                    done.discard(path)
+        return done
+
+    def write(self, records):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pylist([
+            {'path': r['path'], 'top': json.dumps(r.get('top'), ensure_ascii=False), 'error': r.get('error')}
+            for r in records
+        ])
+        name = f"part-{len(self.parts):05d}.parquet"
+        # Часть появляется под своим именем только целиком записанной
+        tmp_path = os.path.join(self.path, name + '.tmp')
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, os.path.join(self.path, name))
+        self.parts.append(name)
+
+
+class BatchRunner:
+    def __init__(self, core, russian_names, writer, batch_size, k):
+        self.core = core
+        self.class_names = core.class_names
+        self.russian_names = russian_names
+        self.writer = writer
+        self.batch_size = batch_size
+        self.k = k
+        self.batch = core.buffer(batch_size)
+        self.batch_paths = []
+        self.records = []
+        self.processed = 0
+
+    def add(self, path, image):
+        self.batch[len(self.batch_paths)] = image
+        self.batch_paths.append(path)
+        if len(self.batch_paths) == self.batch_size:
+            self.flush()
+
+    def add_error(self, path, error):
+        self.records.append({'path': path, 'error': error})
+
+    def flush(self):
+        n = len(self.batch_paths)
+        if n:
+            probabilities = self.core.forward(self.batch[:n])
+            for path, row, indices in zip(self.batch_paths, probabilities, top_k(probabilities, self.k)):
+                self.records.append({
+                    'path': path,
+                    'top': [{
+                        'class': self.class_names[i],
+                        'name': self.russian_names[self.class_names[i]],
+                        'confidence': float(row[i]),
+                    } for i in indices],
+                })
+            self.batch_paths = []
+        if self.records:
+            self.writer.write(self.records)
+            self.processed += len(self.records)
+            self.records = []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетное распознавание статуй по папкам")
+    parser.add_argument('inputs', nargs='+', help="папки с изображениями")
+    parser.add_argument('--output', default='predictions.jsonl', help=".jsonl или .parquet (папка частей)")
+    parser.add_argument('--model-dir', default='.')
+    parser.add_argument('--backend', default='keras')
+    parser.add_argument('--class-names', default='class_names.json')
+    parser.add_argument('--batch-size', type=int, default=128)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--top-k', type=int, default=3)
+    args = parser.parse_args()
+
+    writer = ParquetWriter(args.output) if args.output.endswith('.parquet') else JsonlWriter(args.output)
+
+    print("📁 Индексация файлов...")
+    paths = scan_images(args.inputs)
+    done = writer.done_paths()
+    todo = [path for path in paths if path not in done]
+    print(f"   Найдено {len(paths)}, уже обработано {len(paths) - len(todo)}, осталось {len(todo)}")
+    if not todo:
+        return
+
+    # Пул создается до загрузки модели: процессам не нужен TensorFlow
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=ctx) as pool:
+        with open(args.class_names, 'r', encoding='utf-8') as f:
+            russian_names = json.load(f)
+        print(f"🔄 Загрузка модели ({args.backend})...")
+        core = InferenceCore(load_backend(args.backend, args.model_dir), russian_names)
+        runner = BatchRunner(core, russian_names, writer, args.batch_size, args.top_k)
+
+        chunks = [todo[i:i + DECODE_CHUNK] for i in range(0, len(todo), DECODE_CHUNK)]
+        # Ограниченное окно задач: декодированные, но не посчитанные фото не копятся в памяти
+        window = deque()
+        next_chunk = 0
+        reported = 0
+        start = time.perf_counter()
+        while window or next_chunk < len(chunks):
+            while next_chunk < len(chunks) and len(window) < args.workers * 2:
+                window.append((chunks[next_chunk], pool.submit(decode_chunk, chunks[next_chunk])))
+                next_chunk += 1
+
+            chunk, future = window.popleft()
+            images, errors = future.result()
+            for i, path in enumerate(chunk):
+                if i in errors:
+                    runner.add_error(path, errors[i])
+                else:
+                    runner.add(path, images[i])
+
+            if runner.processed - reported >= args.batch_size * 10:
+                reported = runner.processed
+                rate = runner.processed / (time.perf_counter() - start)
+                print(f"   {runner.processed}/{len(todo)} ({rate:.0f} изобр./с)")
+
+        runner.flush()
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ Готово: {runner.processed} изображений за {elapsed:.1f} с "
+          f"({runner.processed / elapsed:.0f} изобр./с) -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# bench_data_pipeline.py
+"""
+Скорость (изображений в секунду) и пиковая память входного конвейера обучения:
+старый путь (prepare_dataset: все изображения в один float32 массив) против
+dataset_pipeline (tf.data: параллельное декодирование, дисковый кэш, prefetch).
+
+Датасет собирается из пула фото жесткими ссылками до нужного размера:
+по умолчанию пул синтетический, с --source берутся фото из statue_dataset.
+
+    python bench_data_pipeline.py
+    python bench_data_pipeline.py --sizes 1000 10000 50000 --source statue_dataset --output bench.json
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+# statue_inference не импортирует TensorFlow: он не попадает в память старого пути
+from statue_inference import preprocess
+
+NUM_CLASSES = 5
+IMAGE_EXTENSIONS = ('.jpg', '.png', '.jpeg')
+
+
+def synthetic_pool(count=200, width=1280, height=960):
+    rng = np.random.default_rng(42)
+    pool = []
+    for _ in range(count):
+        gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+        pixels = np.clip(gradient + rng.normal(0, 40, (height, width, 3)), 0, 255).astype(np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format='JPEG', quality=90)
+        pool.append(buffer.getvalue())
+    return pool
+
+
+def build_dataset(root, size, pool_dir, pool_files):
+    """root/class_i/img_n.jpg - жесткие ссылки на файлы пула"""
+    paths, labels = [], []
+    for n in range(size):
+        label = n % NUM_CLASSES
+        class_dir = os.path.join(root, f"class_{label}")
+        os.makedirs(class_dir, exist_ok=True)
+        path = os.path.join(class_dir, f"img_{n}.jpg")
+        source = os.path.join(pool_dir, pool_files[n % len(pool_files)])
+        try:
+            os.link(source, path)
+        except OSError:
+            shutil.copyfile(source, path)
+        paths.append(path)
+        labels.append(label)
+    return paths, labels
+
+
+def run_legacy(paths, labels, queue):
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    images = [preprocess(path) for path in paths]
+    X, y = np.array(images), np.array(labels)
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put({
+        'mode': 'numpy',
+        'images': len(X),
+        'images_per_sec': len(X) / elapsed,
+        'peak_rss_mb': peak_rss / 1024,  # ru_maxrss в Linux - в КБ
+        'peak_delta_mb': (peak_rss - base_rss) / 1024,
+    })
+
+
+def run_tf_data(paths, labels, cache_dir, queue):
+    from dataset_pipeline import make_train_val_datasets
+
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    train, val = make_train_val_datasets(paths, labels, batch_size=32, cache_dir=cache_dir)
+
+    epochs = []
+    for _ in range(2):  # первая эпоха декодирует и пишет кэш, вторая читает кэш
+        count = 0
+        start = time.perf_counter()
+        for dataset in (train, val):
+            for images, _ in dataset:
+                count += int(images.shape[0])
+        epochs.append(count / (time.perf_counter() - start))
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put({
+        'mode': 'tf.data',
+        'images': count,
+        'images_per_sec': epochs[0],
+        'cached_images_per_sec': epochs[1],
+        'peak_rss_mb': peak_rss / 1024,
+        'peak_delta_mb': (peak_rss - base_rss) / 1024,
+    })
+
+
+def run_in_process(target, *args):
+    """Каждый режим - в отдельном процессе, чтобы пиковая память не смешивалась"""
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    process = ctx.Process(target=target, args=(*args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк входного конвейера обучения")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--source', help="папка датасета с фото для пула; по умолчанию синтетика")
+    parser.add_argument('--max-numpy-images', type=int, default=10000,
+                        help="выше этого старый путь не запускается (~0.6 МБ памяти на фото)")
+    parser.add_argument('--output', help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    results = []
+    try:
+        pool_dir = os.path.join(workdir, 'pool')
+        os.makedirs(pool_dir)
+        if args.source:
+            n = 0
+            for dirpath, _, filenames in os.walk(args.source):
+                for filename in filenames:
+                    if filename.lower().endswith(IMAGE_EXTENSIONS):
+                        shutil.copyfile(os.path.join(dirpath, filename),
+                                        os.path.join(pool_dir, f"{n}{os.path.splitext(filename)[1]}"))
+                        n += 1
+        else:
+            for n, image_bytes in enumerate(synthetic_pool()):
+                with open(os.path.join(pool_dir, f"{n}.jpg"), 'wb') as f:
+                    f.write(image_bytes)
+        pool_files = sorted(os.listdir(pool_dir))
+        print(f"📷 Пул: {len(pool_files)} фото")
+
+        for size in args.sizes:
+            root = os.path.join(workdir, f"dataset_{size}")
+            paths, labels = build_dataset(root, size, pool_dir, pool_files)
+            print(f"\n📊 {size} изображений")
+
+            if size <= args.max_numpy_images:
+                result = run_in_process(run_legacy, paths, labels)
+            else:
+                result = {'mode': 'numpy', 'skipped': f"нужно ~{size * 0.6 / 1024:.0f} ГБ памяти"}
+            results.append({'size': size, **result})
+
+            cache_dir = os.path.join(workdir, f"cache_{size}")
+            results.append({'size': size, **run_in_process(run_tf_data, paths, labels, cache_dir)})
+
+            for result in results[-2:]:
+                if 'skipped' in result:
+                    print(f"   {result['mode']:8s} пропущено: {result['skipped']}")
+                    continue
+                cached = result.get('cached_images_per_sec')
+                cached_text = f" (из кэша {cached:.0f}/с)" if cached else ""
+                print(f"   {result['mode']:8s} {result['images_per_sec']:8.0f} изобр./с{cached_text}   "
+                      f"пик памяти {result['peak_rss_mb']:.0f} МБ (+{result['peak_delta_mb']:.0f})")
+
+            shutil.rmtree(root, ignore_errors=True)
+            shutil.rmtree(cache_dir, ignore_errors=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Результаты сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
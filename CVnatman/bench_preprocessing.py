@@ -0,0 +1,118 @@
+# bench_preprocessing.py
+"""
+Время и пиковая память предобработки одного фото: старый путь (полное
+декодирование + resize + np.array / 255) против statue_inference.preprocessing.
+
+    python bench_preprocessing.py                  # синтетическое 12 МП JPEG фото
+    python bench_preprocessing.py --image photo.jpg --repeats 50
+"""
+import argparse
+import io
+import multiprocessing
+import resource
+import time
+from queue import Empty
+
+import numpy as np
+from PIL import Image
+
+from statue_inference.preprocessing import IMAGE_SIZE, preprocess
+
+
+def legacy_preprocess(image_bytes):
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image = image.resize(IMAGE_SIZE)
+    return np.array(image, dtype='float32') / 255.0
+
+
+def fused_preprocess(image_bytes, out):
+    return preprocess(image_bytes, out=out)
+
+
+def synthetic_photo(width=4000, height=3000):
+    """Шум поверх градиента: JPEG такого размера близок к фото с камеры телефона"""
+    rng = np.random.default_rng(42)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    pixels = np.clip(gradient + rng.normal(0, 40, (height, width, 3)), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def run_mode(mode, image_bytes, repeats, queue):
+    """Запускается в отдельном процессе, чтобы пиковая память не смешивалась между режимами"""
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    out = np.empty((IMAGE_SIZE[1], IMAGE_SIZE[0], 3), dtype=np.float32)
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        if mode == 'legacy':
+            legacy_preprocess(image_bytes)
+        else:
+            fused_preprocess(image_bytes, out)
+        timings.append(time.perf_counter() - start)
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put({
+        'mode': mode,
+        'mean_ms': float(np.mean(timings) * 1000),
+        'p95_ms': float(np.percentile(timings, 95) * 1000),
+        'peak_delta_mb': (peak_rss - base_rss) / 1024,  # ru_maxrss в Linux - в КБ
+    })
+
+
+def wait_result(process, queue, poll=1.0):
+    """
+    Результат дочернего процесса из очереди. Если процесс упал, не отправив
+    результат (нехватка памяти, abort в TensorFlow), - RuntimeError с кодом выхода
+    """
+    while True:
+        try:
+            return queue.get(timeout=poll)
+        except Empty:
+            if not process.is_alive():
+                try:
+                    # Результат мог прийти в последний момент перед выходом
+                    return queue.get(timeout=poll)
+                except Empty:
+                    raise RuntimeError(f"процесс {process.pid} завершился с кодом {process.exitcode}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк предобработки изображений")
+    parser.add_argument('--image', help="путь к фото; по умолчанию синтетическое 12 МП")
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, 'rb') as f:
+            image_bytes = f.read()
+    else:
+        image_bytes = synthetic_photo()
+
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        print(f"📷 {img.size[0]}x{img.size[1]} {img.format}, {len(image_bytes) / 1024 / 1024:.1f} МБ")
+
+    legacy = legacy_preprocess(image_bytes)
+    fused = fused_preprocess(image_bytes, None)
+    print(f"   Средняя разница пикселей со старым путем: {np.abs(legacy - fused).mean():.4f}")
+
+    ctx = multiprocessing.get_context('spawn')
+    for mode in ('legacy', 'fused'):
+        queue = ctx.Queue()
+        process = ctx.Process(target=run_mode, args=(mode, image_bytes, args.repeats, queue))
+        process.start()
+        try:
+            result = wait_result(process, queue)
+        except RuntimeError as e:
+            raise SystemExit(f"❌ {mode}: {e}")
+        process.join()
+        print(f"   {result['mode']:7s} {result['mean_ms']:8.2f} ms (p95 {result['p95_ms']:.2f})   "
+              f"пик памяти +{result['peak_delta_mb']:.1f} МБ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# compare_backends.py
+"""
+Отчет точность/скорость для бэкендов модели статуй: Keras (float32) против int8 TFLite.
+Точность считается по папкам statue_dataset, согласие - с предсказаниями первого
+доступного бэкенда (обычно Keras); его имя записывается в отчет как reference.
+
+    python compare_backends.py --output backend_report.json
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from statue_inference import BACKENDS, MODEL_FILES, load_backend, preprocess
+from export_statue_model import list_dataset_images
+
+
+def evaluate(backend, images, labels, repeats):
+    # Прогрев, чтобы не мерить построение графа
+    backend.predict(images[:1])
+
+    predictions = []
+    latencies = []
+    for i in range(len(images)):
+        batch = images[i:i + 1]
+        start = time.perf_counter()
+        for _ in range(repeats):
+            probabilities = backend.predict(batch)
+        latencies.append((time.perf_counter() - start) / repeats)
+        predictions.append(int(np.argmax(probabilities[0])))
+
+    predictions = np.array(predictions)
+    latencies_ms = np.array(latencies) * 1000
+    return predictions, {
+        'accuracy': float(np.mean(predictions == labels)),
+        'latency_ms_mean': float(latencies_ms.mean()),
+        'latency_ms_p95': float(np.percentile(latencies_ms, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение бэкендов модели статуй")
+    parser.add_argument('--model-dir', default='.')
+    parser.add_argument('--data-dir', default='statue_dataset')
+    parser.add_argument('--class-names', default='class_names.json')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', default='backend_report.json')
+    args = parser.parse_args()
+
+    with open(args.class_names, 'r', encoding='utf-8') as f:
+        class_names = list(json.load(f).keys())
+
+    paths = [p for p in list_dataset_images(args.data_dir)
+             if os.path.basename(os.path.dirname(p)) in class_names]
+    labels = np.array([class_names.index(os.path.basename(os.path.dirname(p))) for p in paths])
+    images = np.stack([preprocess(p) for p in paths])
+    print(f"📊 {len(paths)} изображений, классы: {class_names}")
+
+    report = {'images': len(paths), 'classes': class_names, 'backends': {}}
+    reference = None
+    reference_name = None
+    for name in BACKENDS:
+        model_path = os.path.join(args.model_dir, MODEL_FILES[name])
+        if not os.path.exists(model_path):
+            print(f"   ⏭️ {name}: нет файла {model_path}")
+            continue
+
+        backend = load_backend(name, args.model_dir)
+        predictions, metrics = evaluate(backend, images, labels, args.repeats)
+        metrics['model_size_mb'] = os.path.getsize(model_path) / 1024 / 1024
+        if reference is None:
+            reference, reference_name = predictions, name
+            report['reference'] = name
+        metrics['agreement'] = float(np.mean(predictions == reference))
+        report['backends'][name] = metrics
+
+        print(f"   {name:7s} точность {metrics['accuracy']:.2%}   "
+              f"согласие с {reference_name} {metrics['agreement']:.2%}   "
+              f"{metrics['latency_ms_mean']:.2f} ms (p95 {metrics['latency_ms_p95']:.2f})   "
+              f"{metrics['model_size_mb']:.1f} МБ")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"💾 Отчет сохранен: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@ import tensorflow as tf
 import numpy as np
 import logging
 from config import ModelConfig
-from image_processor import ImageProcessor
+from statue_inference import InferenceCore, KerasBackend
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -11,8 +11,8 @@ logger = logging.getLogger(__name__)
 class CVModel:
     def __init__(self, model_type='mobilenet_v2'):
         self.config = ModelConfig()
-        self.image_processor = ImageProcessor(self.config.IMAGE_SIZE)
         self.model = None
+        self.core = None
         self.model_type = model_type
         self.load_model()
     
@@ -32,6 +32,13 @@ class CVModel:
                     input_shape=self.config.INPUT_SHAPE
                 )
             
+            # Названия 1000 классов ImageNet по индексу: декодер TensorFlow на единичной матрице
+            labels = [
+                decoded[0][1] for decoded in
+                tf.keras.applications.mobilenet_v2.decode_predictions(np.eye(1000, dtype=np.float32), top=1)
+            ]
+            self.core = InferenceCore(KerasBackend.wrap(self.model), labels, self.config.IMAGE_SIZE)
+            
             logger.info(f"✅ Модель {self.model_type} загружена успешно!")
             
         except Exception as e:
@@ -40,65 +47,26 @@ class CVModel:
     
     def predict_from_bytes(self, image_bytes):
         """Предсказание из bytes изображения"""
-        try:
-            # Предобработка изображения
-            processed_image = self.image_processor.load_from_bytes(image_bytes)
-            
-            # Предсказание
-            predictions = self.model.predict(processed_image, verbose=0)
-            
-            # Декодируем результаты используя встроенный декодер TensorFlow
-            decoded_predictions = tf.keras.applications.mobilenet_v2.decode_predictions(
-                predictions, 
-                top=5  # Топ-5 предсказаний
-            )
-            
-            # Форматируем результаты
-            results = []
-            for _, label, confidence in decoded_predictions[0]:
-                results.append({
-                    'class': label,
-                    'confidence': float(confidence),
-                    'class_id': None  # Можно добавить ID если нужно
-                })
-            
-            return {
-                'success': True,
-                'predictions': results,
-                'model_type': self.model_type,
-                'total_predictions': len(results)
-            }
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка предсказания: {e}")
-            return {
-                'success': False,
-                'error': str(e),
-                'predictions': []
-            }
+        return self.predict(image_bytes)
     
     def predict_from_path(self, image_path):
         """Предсказание из пути к файлу"""
+        return self.predict(image_path)
+    
+    def predict(self, source):
+        """Предсказание для bytes или пути: топ-5 классов ImageNet"""
         try:
-            # Предобработка изображения
-            processed_image = self.image_processor.load_from_path(image_path)
-            
-            # Предсказание
-            predictions = self.model.predict(processed_image, verbose=0)
-            
-            # Декодируем результаты используя встроенный декодер TensorFlow
-            decoded_predictions = tf.keras.applications.mobilenet_v2.decode_predictions(
-                predictions, 
-                top=5  # Топ-5 предсказаний
-            )
+            prediction = self.core.predict(source, k=5)
+            if not prediction['success']:
+                raise ValueError(f"Ошибка загрузки изображения: {prediction['error']}")
             
             # Форматируем результаты
             results = []
-            for _, label, confidence in decoded_predictions[0]:
+            for class_id, confidence in prediction['top']:
                 results.append({
-                    'class': label,
-                    'confidence': float(confidence),
-                    'class_id': None
+                    'class': self.core.class_names[class_id],
+                    'confidence': confidence,
+                    'class_id': class_id
                 })
             
             return {
@@ -0,0 +1,82 @@
+# dataset_pipeline.py
+"""
+Потоковый входной конвейер tf.data для обучения на папке statue_dataset/<класс>/*.jpg.
+
+Вместо одного большого float32 массива в памяти:
+- разбиение train/validation делается по списку путей (со стратификацией);
+- изображения декодируются параллельно (num_parallel_calls) сразу в 224x224 uint8;
+- уменьшенные uint8 изображения кэшируются на диск после первой эпохи
+  (в 4 раза меньше, чем float32), дальше эпохи читаются из кэша без декодирования;
+- перемешивание с ограниченным буфером, перевод в float32 [0, 1] уже батчами, prefetch.
+"""
+import hashlib
+import os
+
+import tensorflow as tf
+from sklearn.model_selection import train_test_split
+
+from statue_inference.preprocessing import IMAGE_SIZE
+
+DATASET_CACHE_DIR = 'dataset_cache'
+SHUFFLE_BUFFER = 2048  # изображений 224x224 uint8: ~300 МБ
+
+
+def decode_image(path, label, img_size=IMAGE_SIZE):
+    """Путь -> uint8 (H, W, 3); bicubic с антиалиасингом близок к PIL Image.resize"""
+    image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+    image = tf.image.resize(image, (img_size[1], img_size[0]), method='bicubic', antialias=True)
+    image = tf.cast(tf.clip_by_value(tf.round(image), 0, 255), tf.uint8)
+    return image, label
+
+
+def to_float(images, labels):
+    return tf.cast(images, tf.float32) / 255.0, labels
+
+
+def make_dataset(paths, labels, batch_size=16, training=False, img_size=IMAGE_SIZE,
+                 cache_path=None, seed=42):
+    """
+    Датасет батчей (float32 [0, 1], метки).
+    cache_path - файл кэша tf.data на диске; '' - кэш в памяти; None - без кэша.
+    """
+    dataset = tf.data.Dataset.from_tensor_slices((list(paths), list(labels)))
+    dataset = dataset.map(
+        lambda path, label: decode_image(path, label, img_size),
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=False,
+    )
+    # Битые файлы пропускаются, а не останавливают обучение
+    dataset = dataset.ignore_errors()
+    if cache_path is not None:
+        if cache_path:
+            os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        dataset = dataset.cache(cache_path)
+    if training:
+        dataset = dataset.shuffle(SHUFFLE_BUFFER, seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(to_float, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def make_train_val_datasets(paths, labels, validation_split=0.2, batch_size=16,
+                            img_size=IMAGE_SIZE, cache_dir=DATASET_CACHE_DIR, seed=42):
+    """Стратифицированное разбиение по путям и два потоковых датасета"""
+    train_paths, val_paths, train_labels, val_labels = train_test_split(
+        paths, labels, test_size=validation_split, random_state=seed, stratify=labels
+    )
+
+    def cache_path(name, split_paths):
+        # Кэш привязан к размеру входа и к файлам выборки: новое или замененное фото - новый кэш
+        if cache_dir is None:
+            return None
+        digest = hashlib.blake2b(digest_size=8)
+        for path in split_paths:
+            stat = os.stat(path)
+            digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}\n".encode('utf-8'))
+        return os.path.join(cache_dir, f"{name}_{img_size[0]}x{img_size[1]}_{digest.hexdigest()}")
+
+    train = make_dataset(train_paths, train_labels, batch_size, training=True,
+                         img_size=img_size, cache_path=cache_path('train', train_paths), seed=seed)
+    val = make_dataset(val_paths, val_labels, batch_size, training=False,
+                       img_size=img_size, cache_path=cache_path('val', val_paths), seed=seed)
+    return train, val
@@ -0,0 +1,106 @@
+# embedding_cache.py
+"""
+Дисковый кэш эмбеддингов замороженного backbone.
+
+Эмбеддинг изображения зависит только от содержимого файла, предобработки
+и backbone, поэтому хранится по ключу (хэш файла, версия backbone и
+предобработки) и пересчитывается только для новых или измененных фото.
+Предобработка та же, что на сервере (statue_inference), иначе голова
+обучалась бы на других входах, чем получает в работе.
+
+    embedding_cache/
+        manifest.json              путь -> [размер, mtime_ns, хэш], чтобы не перечитывать файлы
+        <версия>.npz               keys (хэши) + embeddings (float16)
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+EMBEDDING_CACHE_DIR = 'embedding_cache'
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, cache_dir, backbone_version):
+        self.cache_dir = cache_dir
+        self.backbone_version = backbone_version
+        self.store_path = os.path.join(cache_dir, f"{backbone_version}.npz")
+        self.manifest_path = os.path.join(cache_dir, 'manifest.json')
+        self.manifest = {}
+        self.index = {}
+        self.embeddings = None
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        if os.path.exists(self.store_path):
+            with np.load(self.store_path) as store:
+                keys = store['keys']
+                self.embeddings = store['embeddings']
+            self.index = {key: row for row, key in enumerate(keys.tolist())}
+
+    def hash_files(self, paths):
+        """Хэши файлов; файл читается заново только если изменились размер или время"""
+        hashes = []
+        for path in paths:
+            stat = os.stat(path)
+            entry = self.manifest.get(path)
+            if entry is None or entry[0] != stat.st_size or entry[1] != stat.st_mtime_ns:
+                entry = [stat.st_size, stat.st_mtime_ns, file_hash(path)]
+                self.manifest[path] = entry
+                self.dirty = True
+            hashes.append(entry[2])
+        return hashes
+
+    def missing(self, hashes):
+        """Позиции хэшей, для которых эмбеддинга еще нет (без повторов)"""
+        seen = set()
+        positions = []
+        for i, key in enumerate(hashes):
+            if key not in self.index and key not in seen:
+                seen.add(key)
+                positions.append(i)
+        return positions
+
+    def add(self, hashes, embeddings):
+        embeddings = np.asarray(embeddings, dtype=np.float16)
+        start = 0 if self.embeddings is None else len(self.embeddings)
+        for offset, key in enumerate(hashes):
+            self.index[key] = start + offset
+        if self.embeddings is None:
+            self.embeddings = embeddings
+        else:
+            self.embeddings = np.concatenate([self.embeddings, embeddings])
+        self.dirty = True
+
+    def get(self, hashes):
+        rows = np.fromiter((self.index[key] for key in hashes), dtype=np.int64, count=len(hashes))
+        return self.embeddings[rows].astype(np.float32)
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        keys = np.empty(len(self.index), dtype=object)
+        for key, row in self.index.items():
+            keys[row] = key
+        # Пишем во временный файл и подменяем, чтобы прерванный запуск не испортил кэш
+        tmp_path = self.store_path + '.tmp.npz'
+        np.savez(tmp_path, keys=keys.astype(str), embeddings=self.embeddings)
+        os.replace(tmp_path, self.store_path)
+        with open(self.manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f)
+        os.replace(self.manifest_path + '.tmp', self.manifest_path)
+        self.dirty = False
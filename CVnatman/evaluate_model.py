@@ -0,0 +1,248 @@
+# evaluate_model.py
+"""
+Оценка и бенчмарк классификатора статуй для каждого бэкенда (keras, tflite).
+
+- Точность top-1/top-3 и матрица ошибок на отложенной выборке statue_dataset
+  (то же стратифицированное разбиение 80/20 с random_state=42, что и при обучении).
+- Задержка по этапам (декодирование, resize, нормализация, модель, постобработка)
+  для батчей 1/8/32, пропускная способность и пиковая память процесса.
+- Результат - JSON, чтобы сравнивать версии модели между собой.
+
+    python evaluate_model.py --output eval_report.json
+    python evaluate_model.py --model-dir ../models/v4 --backends tflite --batch-sizes 1 32
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import resource
+import time
+from datetime import datetime, timezone
+from queue import Empty
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+from statue_inference import IMAGE_SIZE, MODEL_FILES, load_backend, top_k
+from statue_inference.preprocessing import open_image, to_array
+
+# TensorFlow здесь не импортируется: он грузится только в процессе бэкенда, которому нужен
+IMAGE_EXTENSIONS = ('.jpg', '.png', '.jpeg')
+STAGES = ('decode', 'resize', 'normalize', 'forward', 'postprocess')
+
+
+def held_out_split(data_dir, class_names, validation_split, seed=42):
+    """Пути и метки отложенной выборки"""
+    paths, labels = [], []
+    for class_idx, class_name in enumerate(class_names):
+        class_dir = os.path.join(data_dir, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        for img_file in sorted(os.listdir(class_dir)):
+            if img_file.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(class_dir, img_file))
+                labels.append(class_idx)
+    _, test_paths, _, test_labels = train_test_split(
+        paths, labels, test_size=validation_split, random_state=seed, stratify=labels
+    )
+    return test_paths, np.array(test_labels)
+
+
+def file_digest(path):
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def decode(path, target_size=IMAGE_SIZE):
+    """Этап decode: то же, что decode_for_model до resize"""
+    with open_image(path) as image:
+        if image.format == 'JPEG':
+            image.draft('RGB', target_size)
+        image = image.convert('RGB') if image.mode != 'RGB' else image.copy()
+    return image
+
+
+def resize(image, target_size=IMAGE_SIZE):
+    return image.resize(target_size) if image.size != tuple(target_size) else image
+
+
+def postprocess(probabilities, class_names, k=3):
+    return [
+        [{'class': class_names[i], 'confidence': float(row[i])} for i in indices]
+        for row, indices in zip(probabilities, top_k(probabilities, k))
+    ]
+
+
+def accuracy_report(backend, paths, labels, class_names, batch_size=32):
+    probabilities = []
+    for start in range(0, len(paths), batch_size):
+        chunk = paths[start:start + batch_size]
+        batch = np.empty((len(chunk), IMAGE_SIZE[1], IMAGE_SIZE[0], 3), dtype=np.float32)
+        for i, path in enumerate(chunk):
+            to_array(resize(decode(path)), out=batch[i])
+        probabilities.append(backend.predict(batch))
+    probabilities = np.concatenate(probabilities)
+
+    top3 = top_k(probabilities, 3)
+    predicted = top3[:, 0]
+    num_classes = len(class_names)
+    confusion = np.zeros((num_classes, num_classes), dtype=np.int64)
+    np.add.at(confusion, (labels, predicted), 1)
+    support = confusion.sum(axis=1)
+    return {
+        'images': len(paths),
+        'top1_accuracy': float(np.mean(predicted == labels)),
+        'top3_accuracy': float(np.mean((top3 == labels[:, None]).any(axis=1))),
+        'per_class_recall': {
+            name: float(confusion[i, i] / support[i]) if support[i] else None
+            for i, name in enumerate(class_names)
+        },
+        # строки - истинный класс, столбцы - предсказанный, порядок как в classes
+        'confusion_matrix': confusion.tolist(),
+    }
+
+
+def latency_report(backend, paths, class_names, batch_size, repeats):
+    timings = {stage: [] for stage in STAGES}
+    batch = np.empty((batch_size, IMAGE_SIZE[1], IMAGE_SIZE[0], 3), dtype=np.float32)
+    sample = [paths[i % len(paths)] for i in range(batch_size)]
+    backend.predict(batch)  # прогрев формы батча
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+        images = [decode(path) for path in sample]
+        decoded = time.perf_counter()
+        images = [resize(image) for image in images]
+        resized = time.perf_counter()
+        for i, image in enumerate(images):
+            to_array(image, out=batch[i])
+        normalized = time.perf_counter()
+        probabilities = backend.predict(batch)
+        forward = time.perf_counter()
+        postprocess(probabilities, class_names)
+        done = time.perf_counter()
+
+        for stage, begin, end in zip(STAGES, (start, decoded, resized, normalized, forward),
+                                     (decoded, resized, normalized, forward, done)):
+            timings[stage].append(end - begin)
+
+    totals = np.sum([timings[stage] for stage in STAGES], axis=0)
+    return {
+        'batch_size': batch_size,
+        'stages_ms': {
+            stage: {
+                'mean': float(np.mean(values) * 1000),
+                'p95': float(np.percentile(values, 95) * 1000),
+            }
+            for stage, values in timings.items()
+        },
+        'total_ms_mean': float(totals.mean() * 1000),
+        'total_ms_p95': float(np.percentile(totals, 95) * 1000),
+        'images_per_sec': float(batch_size / totals.mean()),
+    }
+
+
+def wait_result(process, queue, poll=1.0):
+    """
+    Результат дочернего процесса из очереди. Если процесс упал, не отправив
+    результат (нехватка памяти, abort в TensorFlow), - RuntimeError с кодом выхода
+    """
+    while True:
+        try:
+            return queue.get(timeout=poll)
+        except Empty:
+            if not process.is_alive():
+                try:
+                    # Результат мог прийти в последний момент перед выходом
+                    return queue.get(timeout=poll)
+                except Empty:
+                    raise RuntimeError(f"процесс {process.pid} завершился с кодом {process.exitcode}")
+
+
+def run_backend(name, model_dir, paths, labels, class_names, batch_sizes, repeats, queue):
+    """Запускается в отдельном процессе: пиковая память - только этого бэкенда"""
+    try:
+        load_start = time.perf_counter()
+        backend = load_backend(name, model_dir)
+        report = {
+            'load_sec': time.perf_counter() - load_start,
+            'accuracy': accuracy_report(backend, paths, labels, class_names),
+            'latency': [latency_report(backend, paths, class_names, size, repeats) for size in batch_sizes],
+        }
+        report['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # КБ в Linux
+    except Exception as e:
+        report = {'error': str(e)}
+    queue.put(report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Оценка точности и скорости модели статуй")
+    parser.add_argument('--model-dir', default='.')
+    parser.add_argument('--data-dir', default='statue_dataset')
+    parser.add_argument('--class-names', default=None, help="по умолчанию class_names.json из --model-dir")
+    parser.add_argument('--backends', nargs='+', default=list(MODEL_FILES))
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--validation-split', type=float, default=0.2)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--output', default='eval_report.json')
+    args = parser.parse_args()
+
+    class_names_path = args.class_names or os.path.join(args.model_dir, 'class_names.json')
+    with open(class_names_path, 'r', encoding='utf-8') as f:
+        class_names = list(json.load(f).keys())
+
+    paths, labels = held_out_split(args.data_dir, class_names, args.validation_split)
+    print(f"📊 Отложенная выборка: {len(paths)} изображений, классы: {class_names}")
+
+    report = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'data_dir': args.data_dir,
+        'classes': class_names,
+        'held_out_images': len(paths),
+        'backends': {},
+    }
+
+    ctx = multiprocessing.get_context('spawn')
+    for name in args.backends:
+        model_path = os.path.join(args.model_dir, MODEL_FILES[name])
+        if not os.path.exists(model_path):
+            print(f"   ⏭️ {name}: нет файла {model_path}")
+            continue
+
+        queue = ctx.Queue()
+        process = ctx.Process(target=run_backend, args=(
+            name, args.model_dir, paths, labels, class_names, args.batch_sizes, args.repeats, queue
+        ))
+        process.start()
+        try:
+            result = wait_result(process, queue)
+        except RuntimeError as e:
+            result = {'error': str(e)}
+        process.join()
+        result['model_file'] = MODEL_FILES[name]
+        result['model_digest'] = file_digest(model_path)
+        result['model_size_mb'] = os.path.getsize(model_path) / 1024 / 1024
+        report['backends'][name] = result
+
+        if 'error' in result:
+            print(f"   ❌ {name}: {result['error']}")
+            continue
+        accuracy = result['accuracy']
+        print(f"\n🧪 {name}: top-1 {accuracy['top1_accuracy']:.2%}, top-3 {accuracy['top3_accuracy']:.2%}, "
+              f"пик памяти {result['peak_rss_mb']:.0f} МБ")
+        for latency in result['latency']:
+            stages = "  ".join(f"{stage} {latency['stages_ms'][stage]['mean']:.1f}" for stage in STAGES)
+            print(f"   батч {latency['batch_size']:3d}: {latency['total_ms_mean']:8.1f} ms  "
+                  f"{latency['images_per_sec']:7.1f} изобр./с   ({stages})")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Отчет сохранен: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# export_statue_model.py
+"""
+Экспорт обученной модели в квантованный int8 TFLite.
+Калибровка диапазонов активаций - на изображениях из statue_dataset.
+
+    python export_statue_model.py
+    python export_statue_model.py --model statue_recognition_model.h5 --calibration-images 200
+"""
+import argparse
+import os
+import random
+
+import numpy as np
+import tensorflow as tf
+
+from statue_inference import MODEL_FILES, preprocess
+
+IMAGE_EXTENSIONS = ('.jpg', '.png', '.jpeg')
+
+
+def list_dataset_images(data_dir):
+    """Все изображения датасета: список путей"""
+    paths = []
+    for class_name in sorted(os.listdir(data_dir)):
+        class_dir = os.path.join(data_dir, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        for img_file in sorted(os.listdir(class_dir)):
+            if img_file.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(class_dir, img_file))
+    return paths
+
+
+def representative_dataset(paths):
+    """
+    Генератор калибровочных примеров для конвертера. Предобработка та же,
+    что на сервере: диапазоны int8 калибруются на тех входах, что модель получает в работе.
+    """
+    def generator():
+        for path in paths:
+            yield [np.expand_dims(preprocess(path), axis=0)]
+    return generator
+
+
+def export_int8(model_path, data_dir, output_path, calibration_images):
+    print(f"🔄 Загрузка модели {model_path}...")
+    model = tf.keras.models.load_model(model_path)
+
+    paths = list_dataset_images(data_dir)
+    if not paths:
+        raise Exception(f"❌ Нет изображений для калибровки в {data_dir}")
+    random.Random(42).shuffle(paths)
+    paths = paths[:calibration_images]
+    print(f"📊 Калибровка на {len(paths)} изображениях")
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset(paths)
+    # Все операции в int8; вход и выход остаются float32, чтобы не менять предобработку
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    tflite_model = converter.convert()
+    with open(output_path, 'wb') as f:
+        f.write(tflite_model)
+
+    original_size = os.path.getsize(model_path) / 1024 / 1024
+    exported_size = len(tflite_model) / 1024 / 1024
+    print(f"💾 Сохранено: {output_path} ({exported_size:.1f} МБ, исходная модель {original_size:.1f} МБ)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Экспорт модели статуй в int8 TFLite")
+    parser.add_argument('--model', default=MODEL_FILES['keras'])
+    parser.add_argument('--data-dir', default='statue_dataset')
+    parser.add_argument('--output', default=MODEL_FILES['tflite'])
+    parser.add_argument('--calibration-images', type=int, default=200)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f"❌ Модель {args.model} не найдена. Сначала обучите модель.")
+        return
+
+    export_int8(args.model, args.data_dir, args.output, args.calibration_images)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+# statue_inference - общий код инференса модели статуй для сервера, CLI и обучения
+from .backends import BACKENDS, MODEL_FILES, KerasBackend, load_backend
+from .core import InferenceCore, top_k
+from .metadata import METADATA_FILE, StatueInfo, load_catalog
+from .worker_pool import WorkerPoolBackend
+from .preprocessing import IMAGE_SIZE, PREPROCESSING_VERSION, ImageTooLargeError, preprocess, preprocess_batch
@@ -0,0 +1,106 @@
+# backends.py
+"""
+Бэкенды для запуска модели распознавания статуй.
+
+У всех бэкендов один интерфейс: predict(batch) принимает float32 массив
+(N, 224, 224, 3) со значениями в [0, 1] и возвращает вероятности (N, num_classes).
+TensorFlow импортируется только внутри бэкенда, которому он нужен.
+"""
+import os
+import threading
+
+import numpy as np
+
+# Имена файлов модели в папке models для каждого бэкенда
+MODEL_FILES = {
+    'keras': 'statue_recognition_model.h5',
+    'tflite': 'statue_recognition_model_int8.tflite',
+}
+
+
+class KerasBackend:
+    name = 'keras'
+
+    def __init__(self, model_path):
+        import tensorflow as tf
+        self.model = tf.keras.models.load_model(model_path)
+
+    @classmethod
+    def wrap(cls, model):
+        """Бэкенд для уже загруженной (например, только что обученной) Keras модели"""
+        backend = cls.__new__(cls)
+        backend.model = model
+        return backend
+
+    def predict(self, batch):
+        return self.model.predict(batch, verbose=0)
+
+
+class TFLiteBackend:
+    """Квантованная int8 модель через TFLite; без TensorFlow, если установлен tflite_runtime"""
+    name = 'tflite'
+
+    def __init__(self, model_path, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        # model_path (а не model_content) - файл отображается в память, а не копируется
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input_details = self.interpreter.get_input_details()[0]
+        self.output_details = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self.input_details['shape'][0])
+        # Интерпретатор не потокобезопасен: размер входа, тензоры и invoke -
+        # общее состояние, а сервер вызывает predict из нескольких потоков
+        self._lock = threading.Lock()
+
+    def _resize(self, batch_size):
+        if batch_size != self._batch_size:
+            shape = list(self.input_details['shape'])
+            shape[0] = batch_size
+            self.interpreter.resize_tensor_input(self.input_details['index'], shape)
+            self.interpreter.allocate_tensors()
+            self.input_details = self.interpreter.get_input_details()[0]
+            self.output_details = self.interpreter.get_output_details()[0]
+            self._batch_size = batch_size
+
+    def predict(self, batch):
+        input_dtype = self.input_details['dtype']
+        if input_dtype in (np.int8, np.uint8):
+            scale, zero_point = self.input_details['quantization']
+            info = np.iinfo(input_dtype)
+            batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(input_dtype)
+        else:
+            batch = batch.astype(input_dtype, copy=False)
+
+        with self._lock:
+            self._resize(len(batch))
+            self.interpreter.set_tensor(self.input_details['index'], batch)
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self.output_details['index'])
+            output_details = self.output_details
+
+        if output_details['dtype'] in (np.int8, np.uint8):
+            scale, zero_point = output_details['quantization']
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+
+BACKENDS = {
+    'keras': KerasBackend,
+    'tflite': TFLiteBackend,
+}
+
+
+def load_backend(name, model_dir, **kwargs):
+    """Создает бэкенд по имени для модели из папки model_dir"""
+    if name not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд: {name}. Доступны: {', '.join(BACKENDS)}")
+
+    model_path = os.path.join(model_dir, MODEL_FILES[name])
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Файл модели не найден: {model_path}")
+    return BACKENDS[name](model_path, **kwargs)
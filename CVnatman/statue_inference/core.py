@@ -0,0 +1,103 @@
+# core.py
+"""
+Единое ядро инференса: предобработка в заранее выделенный батч, вызов бэкенда и top-k.
+
+Сервер, CLI и обучение получают предсказания только отсюда, поэтому оптимизации
+предобработки и постобработки делаются и измеряются в одном месте.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+from .backends import load_backend
+from .preprocessing import IMAGE_SIZE, decode_for_model, open_image, to_array
+
+
+def top_k(probabilities, k):
+    """Индексы k наибольших вероятностей в каждой строке (N, C), по убыванию; O(C), а не O(C log C)"""
+    k = min(k, probabilities.shape[1])
+    top = np.argpartition(probabilities, -k, axis=1)[:, -k:]
+    order = np.argsort(np.take_along_axis(probabilities, top, axis=1), axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+class InferenceCore:
+    """
+    Предсказания для батча источников (bytes, путь или файловый объект).
+
+    Результат predict_batch выровнен по источникам, каждый элемент:
+      {'success': True, 'top': [(индекс класса, уверенность), ...], 'probabilities': строка}
+      {'success': False, 'error': текст}  - изображение не удалось прочитать
+      None                                - изображение отброшено on_image
+    """
+
+    def __init__(self, backend, class_names, img_size=IMAGE_SIZE):
+        self.backend = backend
+        self.class_names = list(class_names)
+        self.img_size = tuple(img_size)
+        # Буфер батча свой у каждого потока: сервер считает батчи в нескольких потоках
+        self._local = threading.local()
+
+    @classmethod
+    def from_model_dir(cls, model_dir, backend='keras', class_names_path=None, **kwargs):
+        """Бэкенд и классы из папки модели (файл модели + class_names.json)"""
+        class_names_path = class_names_path or os.path.join(model_dir, 'class_names.json')
+        with open(class_names_path, 'r', encoding='utf-8') as f:
+            class_names = list(json.load(f).keys())
+        return cls(load_backend(backend, model_dir, **kwargs), class_names)
+
+    def buffer(self, n):
+        """Батч (n, H, W, 3) float32; память выделяется заново, только если буфер мал"""
+        batch = getattr(self._local, 'batch', None)
+        if batch is None or len(batch) < n:
+            batch = np.empty((max(n, 1), self.img_size[1], self.img_size[0], 3), dtype=np.float32)
+            self._local.batch = batch
+        return batch[:n]
+
+    def load_into(self, source, out):
+        """Единственный путь предобработки: источник -> RGB нужного размера -> float32 в out"""
+        with open_image(source) as image:
+            image = decode_for_model(image, self.img_size)
+            # Без уменьшения и конвертации это то же ленивое изображение:
+            # пиксели читаются до закрытия файла, on_image получает загруженное
+            image.load()
+            to_array(image, out=out)
+        return image
+
+    def forward(self, batch):
+        return self.backend.predict(batch)
+
+    def predict_batch(self, sources, k=3, on_image=None):
+        """
+        on_image(i, image) вызывается для каждого прочитанного изображения;
+        если вернет False, изображение в модель не идет (например, найден дубль).
+        """
+        batch = self.buffer(len(sources))
+        results = [None] * len(sources)
+        positions = []
+
+        for i, source in enumerate(sources):
+            try:
+                # Пишем прямо в следующую свободную строку батча
+                image = self.load_into(source, batch[len(positions)])
+            except Exception as e:
+                results[i] = {'success': False, 'error': str(e)}
+                continue
+            if on_image is not None and on_image(i, image) is False:
+                continue
+            positions.append(i)
+
+        if positions:
+            probabilities = self.forward(batch[:len(positions)])
+            for i, row, indices in zip(positions, probabilities, top_k(probabilities, k)):
+                results[i] = {
+                    'success': True,
+                    'top': [(int(idx), float(row[idx])) for idx in indices],
+                    'probabilities': row,
+                }
+        return results
+
+    def predict(self, source, k=3):
+        return self.predict_batch([source], k)[0]
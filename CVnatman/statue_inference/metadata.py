@@ -0,0 +1,61 @@
+# metadata.py
+"""
+Метаданные статуй: название, описание, интересный факт и связанная метка на карте (marks.id).
+
+Общий каталог всех божеств - CVnatman/statue_metadata.json. При обучении из него
+в папку модели пишется statues.json только для обученных классов и в порядке
+выходов модели, поэтому метаданные версионируются вместе с моделью.
+Загружаются один раз в неизменяемый кортеж: постобработка - доступ по индексу класса.
+"""
+import json
+import os
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+METADATA_FILE = 'statues.json'
+DEFAULT_DESCRIPTION = 'Славянское божество'
+DEFAULT_FACT = 'Важная часть славянской мифологии и культуры.'
+
+
+class StatueInfo(NamedTuple):
+    key: str
+    name: str
+    description: str
+    interesting_fact: str
+    mark_id: Optional[int] = None
+
+
+def read_metadata(path) -> Dict[str, dict]:
+    """Файл метаданных -> словарь класс -> поля"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)['statues']
+
+
+def build_catalog(class_names: Iterable[str], metadata: Dict[str, dict],
+                  names: Optional[Dict[str, str]] = None) -> Tuple[StatueInfo, ...]:
+    """Кортеж StatueInfo по индексу класса модели; для классов без метаданных - значения по умолчанию"""
+    names = names or {}
+    catalog = []
+    for key in class_names:
+        entry = metadata.get(key, {})
+        catalog.append(StatueInfo(
+            key=key,
+            name=entry.get('name') or names.get(key, key),
+            description=entry.get('description') or DEFAULT_DESCRIPTION,
+            interesting_fact=entry.get('interesting_fact') or DEFAULT_FACT,
+            mark_id=entry.get('mark_id'),
+        ))
+    return tuple(catalog)
+
+
+def load_catalog(model_dir, class_names: Iterable[str],
+                 names: Optional[Dict[str, str]] = None) -> Tuple[StatueInfo, ...]:
+    """Каталог из statues.json папки модели; у старых версий модели файла нет - только названия"""
+    path = os.path.join(model_dir, METADATA_FILE)
+    metadata = read_metadata(path) if os.path.exists(path) else {}
+    return build_catalog(class_names, metadata, names)
+
+
+def write_metadata(path, class_names: Iterable[str], metadata: Dict[str, dict]):
+    """statues.json для модели: только ее классы, в порядке ее выходов"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'statues': {key: metadata[key] for key in class_names}}, f, ensure_ascii=False, indent=2)
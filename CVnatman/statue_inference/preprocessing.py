@@ -0,0 +1,93 @@
+# preprocessing.py
+"""
+Общая предобработка изображений для модели: декодирование, уменьшение и нормализация.
+
+- JPEG декодируется сразу в уменьшенном масштабе (Image.draft): 12 МП фото
+  превращается в ~0.2 МП еще при декодировании, без полного растра в памяти.
+- Перевод в float32 и деление на 255 делаются одной операцией в заранее
+  выделенный буфер (например, строку батча), без промежуточных массивов.
+- Слишком большие файлы и изображения отклоняются до декодирования.
+"""
+import io
+
+import numpy as np
+from PIL import Image
+
+IMAGE_SIZE = (224, 224)
+# Меняется при любом изменении результата предобработки (draft, ресайз, нормализация):
+# входит в ключи кэшей, построенных на предобработанных изображениях
+PREPROCESSING_VERSION = 'pil-draft-v1'
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+MAX_IMAGE_PIXELS = 50_000_000
+
+_SCALE = np.float32(1.0 / 255.0)
+
+
+class ImageTooLargeError(ValueError):
+    pass
+
+
+def check_size(image_bytes):
+    if len(image_bytes) > MAX_IMAGE_BYTES:
+        raise ImageTooLargeError(
+            f"Файл слишком большой: {len(image_bytes) / 1024 / 1024:.1f} МБ "
+            f"(максимум {MAX_IMAGE_BYTES // 1024 // 1024} МБ)"
+        )
+
+
+def open_image(source):
+    """Открывает изображение (bytes, путь или файловый объект); читается только заголовок"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        check_size(source)
+        source = io.BytesIO(source)
+
+    image = Image.open(source)
+    width, height = image.size
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ImageTooLargeError(f"Изображение слишком большое: {width}x{height}")
+    return image
+
+
+def decode_for_model(image, target_size=IMAGE_SIZE):
+    """Декодирует изображение в RGB размера target_size"""
+    if image.format == 'JPEG':
+        # Декодер JPEG сам уменьшает в 2/4/8 раз, оставляя размер не меньше target_size
+        image.draft('RGB', target_size)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    if image.size != tuple(target_size):
+        image = image.resize(target_size)
+    return image
+
+
+def to_array(image, out=None):
+    """RGB-изображение -> float32 [0, 1]; результат пишется в out, если он передан"""
+    width, height = image.size
+    if out is None:
+        out = np.empty((height, width, 3), dtype=np.float32)
+    np.multiply(np.asarray(image, dtype=np.uint8), _SCALE, out=out)
+    return out
+
+
+def preprocess(source, target_size=IMAGE_SIZE, out=None):
+    """bytes / путь / файл -> float32 массив (H, W, 3)"""
+    with open_image(source) as image:
+        return to_array(decode_for_model(image, target_size), out=out)
+
+
+def preprocess_batch(sources, target_size=IMAGE_SIZE):
+    """
+    Предобработка нескольких изображений в один заранее выделенный батч.
+    Возвращает (batch, ok_indices, errors): строки batch соответствуют ok_indices,
+    errors - словарь индекс -> текст ошибки для изображений, которые не удалось открыть.
+    """
+    batch = np.empty((len(sources), target_size[1], target_size[0], 3), dtype=np.float32)
+    ok_indices = []
+    errors = {}
+    for i, source in enumerate(sources):
+        try:
+            preprocess(source, target_size, out=batch[len(ok_indices)])
+            ok_indices.append(i)
+        except Exception as e:
+            errors[i] = str(e)
+    return batch[:len(ok_indices)], ok_indices, errors
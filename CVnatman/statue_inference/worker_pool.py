@@ -0,0 +1,201 @@
+# worker_pool.py
+"""
+Пул процессов инференса с общей моделью.
+
+Вместо того чтобы каждый процесс API загружал свою копию TensorFlow и весов,
+фиксированное число процессов считает модель, а вызывающий процесс передает им
+батчи через разделяемую память:
+
+- батч float32 копируется в "дорожку" (lane) общего сегмента SharedMemory,
+  по очереди задач уходит только (номер дорожки, размер батча) - без pickle тензоров;
+- процесс пула пишет вероятности в ту же дорожку и отвечает через очередь дорожки;
+- модель TFLite открывается по пути (mmap), поэтому страницы файла модели
+  общие для всех процессов через page cache.
+
+WorkerPoolBackend имеет тот же интерфейс predict(batch), что и остальные бэкенды.
+Если процесс пула упал или не ответил за TASK_TIMEOUT, пул помечается
+неисправным (failed): predict сразу отвечает ошибкой, а реестр моделей
+загружает версию заново с новым пулом.
+"""
+import json
+import multiprocessing
+import os
+import queue
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .backends import load_backend
+from .preprocessing import IMAGE_SIZE
+
+START_TIMEOUT = 120  # секунд на загрузку модели в процессе пула
+TASK_TIMEOUT = 60    # секунд на один батч; больше - процесс пула считается упавшим
+POLL_INTERVAL = 1.0  # как часто при ожидании ответа проверять, живы ли процессы пула
+
+
+def _attach(name):
+    """Подключение к сегменту без регистрации в resource_tracker (иначе он удалит сегмент при выходе процесса)"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: параметра track нет
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def _lane_views(buffer, lane, max_batch_size, num_classes, img_size):
+    input_shape = (max_batch_size, img_size[1], img_size[0], 3)
+    input_bytes = int(np.prod(input_shape)) * 4
+    lane_bytes = input_bytes + max_batch_size * num_classes * 4
+    offset = lane * lane_bytes
+    inputs = np.ndarray(input_shape, dtype=np.float32, buffer=buffer, offset=offset)
+    outputs = np.ndarray((max_batch_size, num_classes), dtype=np.float32, buffer=buffer,
+                         offset=offset + input_bytes)
+    return inputs, outputs
+
+
+def _worker_main(model_dir, backend, backend_kwargs, shm_name, lanes, max_batch_size,
+                 num_classes, img_size, tasks, results, ready):
+    shm = _attach(shm_name)
+    try:
+        model = load_backend(backend, model_dir, **backend_kwargs)
+        views = [_lane_views(shm.buf, lane, max_batch_size, num_classes, img_size) for lane in range(lanes)]
+        ready.put((os.getpid(), None))
+    except Exception as e:
+        ready.put((os.getpid(), str(e)))
+        shm.close()
+        return
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        lane, n = task
+        inputs, outputs = views[lane]
+        try:
+            outputs[:n] = model.predict(inputs[:n])
+            results[lane].put(None)
+        except Exception as e:
+            results[lane].put(str(e))
+
+    del views
+    shm.close()
+
+
+class WorkerPoolBackend:
+    name = 'pool'
+
+    def __init__(self, model_dir, backend='tflite', processes=2, lanes=None, max_batch_size=16,
+                 img_size=IMAGE_SIZE, **backend_kwargs):
+        with open(os.path.join(model_dir, 'class_names.json'), 'r', encoding='utf-8') as f:
+            self.num_classes = len(json.load(f))
+        self.processes = processes
+        self.lanes = lanes or processes * 2
+        self.max_batch_size = max_batch_size
+        self.img_size = tuple(img_size)
+        self.failed = None  # причина, по которой пул больше не обслуживает запросы
+
+        lane_bytes = (max_batch_size * img_size[0] * img_size[1] * 3 + max_batch_size * self.num_classes) * 4
+        self._shm = shared_memory.SharedMemory(create=True, size=lane_bytes * self.lanes)
+        self._views = [
+            _lane_views(self._shm.buf, lane, max_batch_size, self.num_classes, self.img_size)
+            for lane in range(self.lanes)
+        ]
+
+        # spawn: процессы пула не наследуют память и потоки TensorFlow вызывающего процесса
+        ctx = multiprocessing.get_context('spawn')
+        self._tasks = ctx.Queue()
+        self._results = [ctx.Queue() for _ in range(self.lanes)]
+        self._free_lanes = queue.Queue()
+        for lane in range(self.lanes):
+            self._free_lanes.put(lane)
+
+        ready = ctx.Queue()
+        self._workers = [
+            ctx.Process(
+                target=_worker_main,
+                args=(model_dir, backend, backend_kwargs, self._shm.name, self.lanes, max_batch_size,
+                      self.num_classes, self.img_size, self._tasks, self._results, ready),
+                daemon=True,
+            )
+            for _ in range(processes)
+        ]
+        for worker in self._workers:
+            worker.start()
+        try:
+            for _ in self._workers:
+                _, error = ready.get(timeout=START_TIMEOUT)
+                if error:
+                    raise RuntimeError(f"Процесс пула не загрузил модель: {error}")
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def pids(self):
+        return [worker.pid for worker in self._workers]
+
+    def _fail(self, reason):
+        if self.failed is None:
+            self.failed = reason
+        raise RuntimeError(self.failed)
+
+    def _check_workers(self):
+        for worker in self._workers:
+            if not worker.is_alive():
+                self._fail(f"Процесс пула инференса {worker.pid} завершился с кодом {worker.exitcode}")
+
+    def _wait_result(self, lane):
+        deadline = time.monotonic() + TASK_TIMEOUT
+        while True:
+            try:
+                return self._results[lane].get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                self._check_workers()
+                if time.monotonic() >= deadline:
+                    self._fail(f"Процесс пула инференса не ответил за {TASK_TIMEOUT} с")
+
+    def predict(self, batch):
+        if self.failed:
+            raise RuntimeError(self.failed)
+        try:
+            lane = self._free_lanes.get(timeout=TASK_TIMEOUT)
+        except queue.Empty:
+            raise RuntimeError(f"Нет свободной дорожки пула инференса за {TASK_TIMEOUT} с")
+        try:
+            # Пока ждали дорожку, пул мог стать неисправным
+            if self.failed:
+                raise RuntimeError(self.failed)
+            self._check_workers()
+            output = np.empty((len(batch), self.num_classes), dtype=np.float32)
+            inputs, outputs = self._views[lane]
+            for start in range(0, len(batch), self.max_batch_size):
+                n = min(self.max_batch_size, len(batch) - start)
+                inputs[:n] = batch[start:start + n]
+                self._tasks.put((lane, n))
+                error = self._wait_result(lane)
+                if error:
+                    raise RuntimeError(error)
+                output[start:start + n] = outputs[:n]
+            return output
+        finally:
+            # Дорожка возвращается и после сбоя: неисправный пул больше не ставит задач,
+            # а ожидающие потоки сразу получают ошибку вместо ожидания таймаута
+            self._free_lanes.put(lane)
+
+    def close(self):
+        if self._shm is None:
+            return
+        for _ in self._workers:
+            self._tasks.put(None)
+        for worker in self._workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        self._views = []
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
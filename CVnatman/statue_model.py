@@ -3,10 +3,16 @@ import tensorflow as tf
 from tensorflow import keras
 import numpy as np
 import os
-from PIL import Image
 from sklearn.model_selection import train_test_split
 import matplotlib.pyplot as plt
 
+from embedding_cache import EmbeddingCache, EMBEDDING_CACHE_DIR
+from statue_inference import InferenceCore, KerasBackend, PREPROCESSING_VERSION, preprocess
+from dataset_pipeline import make_train_val_datasets
+
+# Сколько изображений прогонять через backbone за раз при заполнении кэша эмбеддингов
+EMBED_BATCH_SIZE = 64
+
 class StatueRecognitionModel:
     def __init__(self, statue_classes):
         # Фильтруем классы, оставляя только те, у которых есть данные
@@ -18,6 +24,7 @@ class StatueRecognitionModel:
         self.statue_classes = self.available_classes
         self.num_classes = len(self.statue_classes)
         self.model = None
+        self.core = None
         self.img_size = (224, 224)
         
         print(f"🎯 Модель будет обучена на {self.num_classes} классах: {self.statue_classes}")
@@ -38,24 +45,34 @@ class StatueRecognitionModel:
                 print(f"   ❌ {class_name}: папка не найдена")
         return available
         
-    def prepare_dataset(self, data_dir):
-        """Подготовка датасета"""
-        images = []
+    def list_images(self, data_dir):
+        """Пути к изображениям и индексы их классов"""
+        paths = []
         labels = []
         
         for class_idx, class_name in enumerate(self.statue_classes):
             class_dir = os.path.join(data_dir, class_name)
             
-            print(f"📁 Загружаем изображения для: {class_name}")
-            
-            for img_file in os.listdir(class_dir):
+            for img_file in sorted(os.listdir(class_dir)):
                 if img_file.lower().endswith(('.jpg', '.png', '.jpeg')):
-                    img_path = os.path.join(class_dir, img_file)
-                    img = self.preprocess_image(img_path)
-                    
-                    if img is not None:
-                        images.append(img)
-                        labels.append(class_idx)
+                    paths.append(os.path.join(class_dir, img_file))
+                    labels.append(class_idx)
+        
+        return paths, labels
+        
+    def prepare_dataset(self, data_dir):
+        """Подготовка датасета целиком в памяти (для обучения используется dataset_pipeline)"""
+        images = []
+        labels = []
+        
+        print("📁 Загружаем изображения...")
+        paths, path_labels = self.list_images(data_dir)
+        for img_path, class_idx in zip(paths, path_labels):
+            img = self.load_image(img_path)
+            
+            if img is not None:
+                images.append(img)
+                labels.append(class_idx)
         
         if len(images) == 0:
             raise Exception("❌ Не найдено изображений для обучения")
@@ -63,15 +80,10 @@ class StatueRecognitionModel:
         print(f"✅ Итог: загружено {len(images)} изображений")
         return np.array(images), np.array(labels)
     
-    def preprocess_image(self, img_path):
-        """Предобработка изображения"""
+    def load_image(self, img_path, out=None):
+        """Изображение через общую предобработку statue_inference (как на сервере); None при ошибке"""
         try:
-            with Image.open(img_path) as img:
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                img = img.resize(self.img_size)
-                img_array = np.array(img, dtype='float32') / 255.0
-                return img_array
+            return preprocess(img_path, self.img_size, out=out)
         except Exception as e:
             print(f"   ❌ Ошибка загрузки {img_path}: {e}")
             return None
@@ -89,9 +101,7 @@ class StatueRecognitionModel:
         self.model = tf.keras.Sequential([
             base_model,
             tf.keras.layers.GlobalAveragePooling2D(),
-            tf.keras.layers.Dense(128, activation='relu'),
-            tf.keras.layers.Dropout(0.3),
-            tf.keras.layers.Dense(self.num_classes, activation='softmax')
+            *self.head_layers()
         ])
         
         self.model.compile(
@@ -103,15 +113,66 @@ class StatueRecognitionModel:
         print(f"✅ Модель создана для {self.num_classes} классов: {self.statue_classes}")
         return self.model
     
-    def train(self, data_dir, epochs=20, validation_split=0.2):
-        """Обучение модели"""
+    def head_layers(self):
+        """Обучаемая голова поверх эмбеддингов backbone"""
+        return [
+            tf.keras.layers.Dense(128, activation='relu'),
+            tf.keras.layers.Dropout(0.3),
+            tf.keras.layers.Dense(self.num_classes, activation='softmax')
+        ]
+    
+    def backbone_version(self):
+        """Ключ кэша эмбеддингов: меняется вместе с backbone, его весами, размером входа и предобработкой"""
+        return (f"mobilenetv2_imagenet_{self.img_size[0]}x{self.img_size[1]}"
+                f"_{PREPROCESSING_VERSION}_tf{tf.__version__}")
+    
+    def compute_embeddings(self, paths, cache_dir):
+        """
+        Эмбеддинги backbone (выход GlobalAveragePooling2D) для всех путей.
+        Через backbone проходят только изображения, которых еще нет в кэше.
+        Возвращает эмбеддинги и маску изображений, которые удалось прочитать.
+        """
+        extractor = tf.keras.Sequential(self.model.layers[:2])
+        cache = EmbeddingCache(cache_dir, self.backbone_version())
+        hashes = cache.hash_files(paths)
+        missing = cache.missing(hashes)
+        print(f"🧮 Эмбеддингов в кэше: {len(paths) - len(missing)} из {len(paths)}, считаем {len(missing)}")
+        
+        failed = set()
+        batch = np.empty((EMBED_BATCH_SIZE, self.img_size[1], self.img_size[0], 3), dtype=np.float32)
+        for start in range(0, len(missing), EMBED_BATCH_SIZE):
+            keys = []
+            for i in missing[start:start + EMBED_BATCH_SIZE]:
+                # Пишем прямо в следующую свободную строку батча
+                if self.load_image(paths[i], out=batch[len(keys)]) is None:
+                    failed.add(hashes[i])
+                    continue
+                keys.append(hashes[i])
+            if keys:
+                cache.add(keys, extractor.predict(batch[:len(keys)], verbose=0))
+        cache.save()
+        
+        mask = np.array([key not in failed for key in hashes], dtype=bool)
+        return cache.get([key for key, ok in zip(hashes, mask) if ok]), mask
+    
+    def train(self, data_dir, epochs=20, validation_split=0.2, cache_dir=EMBEDDING_CACHE_DIR):
+        """
+        Обучение модели. Backbone заморожен, поэтому по умолчанию голова обучается
+        на закэшированных эмбеддингах; cache_dir=None - обучение на изображениях целиком.
+        """
+        if cache_dir:
+            return self.train_on_embeddings(data_dir, epochs, validation_split, cache_dir)
+        
         print("📊 Подготовка данных...")
-        X, y = self.prepare_dataset(data_dir)
+        paths, labels = self.list_images(data_dir)
+        if len(paths) == 0:
+            raise Exception("❌ Не найдено изображений для обучения")
         
-        print(f"📈 Данные загружены: {len(X)} изображений")
+        print(f"📈 Найдено изображений: {len(paths)}")
         
-        X_train, X_val, y_train, y_val = train_test_split(
-            X, y, test_size=validation_split, random_state=42, stratify=y
+        # Изображения читаются потоком, а не загружаются в память целиком
+        train_ds, val_ds = make_train_val_datasets(
+            paths, labels, validation_split=validation_split, batch_size=16, img_size=self.img_size
         )
         
         print("🔨 Создание модели...")
@@ -133,14 +194,64 @@ class StatueRecognitionModel:
         
         print("🎯 Начало обучения...")
         history = self.model.fit(
+            train_ds,
+            validation_data=val_ds,
+            epochs=epochs,
+            callbacks=[checkpoint, early_stop],
+            verbose=1
+        )
+        
+        print("✅ Обучение завершено!")
+        self.model.save('statue_recognition_model.h5')
+        print("💾 Модель сохранена как 'statue_recognition_model.h5'")
+        
+        return history
+    
+    def train_on_embeddings(self, data_dir, epochs=20, validation_split=0.2, cache_dir=EMBEDDING_CACHE_DIR):
+        """Обучение головы на эмбеддингах из кэша и сборка полной модели для сохранения"""
+        paths, labels = self.list_images(data_dir)
+        if len(paths) == 0:
+            raise Exception("❌ Не найдено изображений для обучения")
+        
+        print("🔨 Создание модели...")
+        self.build_model()
+        
+        print("📊 Подготовка эмбеддингов...")
+        X, mask = self.compute_embeddings(paths, cache_dir)
+        y = np.array(labels)[mask]
+        print(f"📈 Данные загружены: {len(X)} изображений")
+        
+        X_train, X_val, y_train, y_val = train_test_split(
+            X, y, test_size=validation_split, random_state=42, stratify=y
+        )
+        
+        head = tf.keras.Sequential([tf.keras.Input(shape=(X.shape[1],)), *self.head_layers()])
+        head.compile(
+            optimizer='adam',
+            loss='sparse_categorical_crossentropy',
+            metrics=['accuracy']
+        )
+        
+        early_stop = tf.keras.callbacks.EarlyStopping(
+            monitor='val_loss',
+            patience=5,
+            restore_best_weights=True
+        )
+        
+        print("🎯 Начало обучения...")
+        history = head.fit(
             X_train, y_train,
             validation_data=(X_val, y_val),
             epochs=epochs,
             batch_size=16,
-            callbacks=[checkpoint, early_stop],
+            callbacks=[early_stop],
             verbose=1
         )
         
+        # Переносим веса головы в полную модель: backbone + пулинг + голова
+        for model_layer, head_layer in zip(self.model.layers[2:], head.layers):
+            model_layer.set_weights(head_layer.get_weights())
+        
         print("✅ Обучение завершено!")
         self.model.save('statue_recognition_model.h5')
         print("💾 Модель сохранена как 'statue_recognition_model.h5'")
@@ -156,19 +267,21 @@ class StatueRecognitionModel:
                 print("❌ Модель не обучена и не найдена!")
                 return None
         
-        img = self.preprocess_image(image_path)
-        if img is None:
+        if self.core is None or self.core.backend.model is not self.model:
+            self.core = InferenceCore(KerasBackend.wrap(self.model), self.statue_classes, self.img_size)
+        
+        prediction = self.core.predict(image_path, k=1)
+        if not prediction['success']:
+            print(f"   ❌ Ошибка загрузки {image_path}: {prediction['error']}")
             return None
         
-        prediction = self.model.predict(np.array([img]), verbose=0)
-        class_idx = np.argmax(prediction[0])
-        confidence = prediction[0][class_idx]
+        class_idx, confidence = prediction['top'][0]
         
         return {
             'statue': self.statue_classes[class_idx],
-            'confidence': float(confidence),
+            'confidence': confidence,
             'all_predictions': {
                 self.statue_classes[i]: float(pred) 
-                for i, pred in enumerate(prediction[0])
+                for i, pred in enumerate(prediction['probabilities'])
             }
         }
\ No newline at end of file
@@ -1,15 +1,12 @@
 # test_trained_model.py
-import tensorflow as tf
-import numpy as np
-from PIL import Image
 import os
-import json
+
+from statue_inference import InferenceCore, KerasBackend
 
 class StatueClassifier:
     def __init__(self):
         # Загружаем модель
-        self.model = tf.keras.models.load_model('statue_recognition_model.h5')
-        self.img_size = (224, 224)
+        backend = KerasBackend('statue_recognition_model.h5')
         
         # Русские названия классов
         self.russian_names = {
@@ -18,35 +15,27 @@ class StatueClassifier:
         }
         
         self.class_names = ['perun', 'veles']
+        self.core = InferenceCore(backend, self.class_names)
     
     def predict_image(self, image_path):
         """Распознает статую на изображении"""
         try:
             print(f"🔍 Анализируем: {image_path}")
             
-            # Загрузка и предобработка изображения
-            with Image.open(image_path) as img:
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                img = img.resize(self.img_size)
-                img_array = np.array(img, dtype='float32') / 255.0
-            
-            # Предсказание
-            prediction = self.model.predict(np.array([img_array]), verbose=0)
+            # Предобработка и предсказание; все классы уже по убыванию уверенности
+            prediction = self.core.predict(image_path, k=len(self.class_names))
+            if not prediction['success']:
+                return prediction
             
-            # Получаем результаты для всех классов
             results = []
-            for i, class_name in enumerate(self.class_names):
-                confidence = prediction[0][i]
+            for i, confidence in prediction['top']:
+                class_name = self.class_names[i]
                 results.append({
                     'class': class_name,
                     'russian_name': self.russian_names[class_name],
-                    'confidence': float(confidence)
+                    'confidence': confidence
                 })
             
-            # Сортируем по уверенности
-            results.sort(key=lambda x: x['confidence'], reverse=True)
-            
             return {
                 'success': True,
                 'top_prediction': results[0],
@@ -0,0 +1,63 @@
+# test_inference_core.py
+"""
+Запуск из папки CVnatman:
+    python -m pytest tests
+"""
+import io
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip('numpy')
+Image = pytest.importorskip('PIL.Image')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from statue_inference import IMAGE_SIZE, InferenceCore  # noqa: E402
+
+CLASS_NAMES = ['perun', 'veles', 'mokosh']
+
+
+class FixedBackend:
+    """Бэкенд без модели: одинаковые вероятности для любого изображения"""
+
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, batch):
+        self.batches.append(batch.copy())
+        return np.tile(np.array([0.2, 0.7, 0.1], dtype=np.float32), (len(batch), 1))
+
+
+def jpeg_bytes(size, color=(200, 120, 40)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='JPEG', quality=95)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('size', [IMAGE_SIZE, (448, 448)])
+def test_predict_reads_pixels_before_file_is_closed(size):
+    # 224x224 не уменьшается, а 448x448 уменьшается до 224 еще в декодере JPEG (draft):
+    # в обоих случаях load_into получает то же ленивое изображение, что и открыл
+    backend = FixedBackend()
+    core = InferenceCore(backend, CLASS_NAMES)
+
+    result = core.predict(jpeg_bytes(size))
+
+    assert result['success'], result.get('error')
+    assert result['top'][0][0] == 1
+    batch = backend.batches[0]
+    assert batch.shape == (1, IMAGE_SIZE[1], IMAGE_SIZE[0], 3)
+    assert abs(float(batch[0, 0, 0, 0]) - 200 / 255) < 0.05
+
+
+@pytest.mark.parametrize('size', [IMAGE_SIZE, (448, 448)])
+def test_on_image_gets_loaded_image(size):
+    seen = []
+    core = InferenceCore(FixedBackend(), CLASS_NAMES)
+
+    core.predict_batch([jpeg_bytes(size)], on_image=lambda i, image: seen.append(image.getpixel((0, 0))))
+
+    assert len(seen) == 1
+    assert abs(seen[0][0] - 200) < 10
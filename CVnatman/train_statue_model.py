@@ -1,8 +1,13 @@
 # train_statue_model.py
 from statue_model import StatueRecognitionModel
+from statue_inference import METADATA_FILE
+from statue_inference.metadata import read_metadata, write_metadata
 import os
 import json
 
+# Общий каталог божеств: новая статуя добавляется сюда и фото в statue_dataset/<класс>/
+STATUE_METADATA_PATH = 'statue_metadata.json'
+
 def setup_directories(statue_classes):
     """Создает структуру папок для каждого класса"""
     base_dir = 'statue_dataset'
@@ -18,28 +23,26 @@ def setup_directories(statue_classes):
         print(f"   - {base_dir}/{class_name}/")
 
 def create_class_names_file(statue_classes):
-    """Создает файл с русскими названиями классов"""
-    russian_names = {
-        'perun': 'Перун',
-        'veles': 'Велес', 
-        'mokosh': 'Макошь',
-        'dazhdbog': 'Даждьбог',
-        'svarog': 'Сварог'
-    }
+    """Создает class_names.json и statues.json для обученных классов из общего каталога"""
+    metadata = read_metadata(STATUE_METADATA_PATH)
     
-    # Фильтруем только те классы, которые есть в текущем обучении
-    filtered_names = {cls: russian_names[cls] for cls in statue_classes if cls in russian_names}
+    # Фильтруем только те классы, которые есть в текущем обучении, в порядке выходов модели
+    trained_classes = [cls for cls in statue_classes if cls in metadata]
+    filtered_names = {cls: metadata[cls]['name'] for cls in trained_classes}
     
     with open('class_names.json', 'w', encoding='utf-8') as f:
         json.dump(filtered_names, f, ensure_ascii=False, indent=2)
     
-    print("✅ class_names.json создан!")
+    # Описания, факты и метки версионируются вместе с моделью
+    write_metadata(METADATA_FILE, trained_classes, metadata)
+    
+    print(f"✅ class_names.json и {METADATA_FILE} созданы!")
     print("📋 Содержимое:", filtered_names)
 
 def train_statue_model():
     """Обучение модели распознавания статуй"""
     
-    statue_classes = ['perun', 'veles', 'mokosh', 'dazhdbog', 'svarog']
+    statue_classes = list(read_metadata(STATUE_METADATA_PATH))
     
     if not os.path.exists('statue_dataset'):
         setup_directories(statue_classes)
@@ -1,11 +1,11 @@
 # use_statue_model.py
-import tensorflow as tf
-import numpy as np
-from PIL import Image
 import os
 import json
 import glob
 
+from statue_inference import InferenceCore, KerasBackend
+from statue_inference.metadata import read_metadata
+
 class StatuePredictor:
     def __init__(self, model_path='statue_recognition_model.h5'):
         """Инициализация предсказателя"""
@@ -13,24 +13,20 @@ class StatuePredictor:
             raise FileNotFoundError(f"❌ Модель {model_path} не найдена!")
         
         print("🔄 Загрузка модели...")
-        self.model = tf.keras.models.load_model(model_path)
-        self.img_size = (224, 224)
+        backend = KerasBackend(model_path)
         
         # Загружаем русские названия
         if os.path.exists('class_names.json'):
             with open('class_names.json', 'r', encoding='utf-8') as f:
                 self.russian_names = json.load(f)
         else:
-            # Создаем стандартные названия если файла нет
+            # Берем названия из общего каталога, если файла нет
             self.russian_names = {
-                'perun': 'Перун',
-                'veles': 'Велес',
-                'mokosh': 'Макошь',
-                'dazhdbog': 'Даждьбог', 
-                'svarog': 'Сварог'
+                key: entry['name'] for key, entry in read_metadata('statue_metadata.json').items()
             }
         
         self.class_names = list(self.russian_names.keys())
+        self.core = InferenceCore(backend, self.class_names)
         print("✅ Модель загружена!")
         
         # Список папок для поиска изображений
@@ -112,28 +108,22 @@ class StatuePredictor:
             
             print(f"🔍 Анализируем: {os.path.basename(image_path)}")
             
-            # Загрузка и предобработка изображения
-            with Image.open(image_path) as img:
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                img = img.resize(self.img_size)
-                img_array = np.array(img, dtype='float32') / 255.0
-            
-            # Предсказание
-            prediction = self.model.predict(np.array([img_array]), verbose=0)
-            class_idx = np.argmax(prediction[0])
-            confidence = prediction[0][class_idx]
+            # Предобработка и предсказание
+            prediction = self.core.predict(image_path, k=1)
+            if not prediction['success']:
+                return {'error': prediction['error']}
+            class_idx, confidence = prediction['top'][0]
             class_name = self.class_names[class_idx]
             
             # Формируем все предсказания
             all_predictions = {}
             for i, pred_class in enumerate(self.class_names):
-                all_predictions[self.russian_names[pred_class]] = float(prediction[0][i])
+                all_predictions[self.russian_names[pred_class]] = float(prediction['probabilities'][i])
             
             return {
                 'statue_english': class_name,
                 'statue_russian': self.russian_names[class_name],
-                'confidence': float(confidence),
+                'confidence': confidence,
                 'all_predictions': all_predictions
             }
         except Exception as e:
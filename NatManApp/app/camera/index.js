@@ -47,7 +47,6 @@ export default function CameraScreen() {
       console.log('📸 Making photo...');
       const photo = await cameraRef.current.takePictureAsync({
         quality: 0.7,
-        base64: true,
         exif: false
       });
 
@@ -65,14 +64,17 @@ export default function CameraScreen() {
     try {
       console.log('🔄 Sending to server without auth...');
 
-      const response = await fetch(`${API_BASE_URL}/statues/recognize`, {
+      // Отправляем файл фото как multipart, без base64 (тело на треть меньше)
+      const formData = new FormData();
+      formData.append('file', {
+        uri: photo.uri,
+        name: 'photo.jpg',
+        type: 'image/jpeg',
+      });
+
+      const response = await fetch(`${API_BASE_URL}/statues/recognize-upload`, {
         method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          image: photo.base64,
-        }),
+        body: formData,
       });
 
       if (!response.ok) {
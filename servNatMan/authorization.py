@@ -1,28 +1,58 @@
 ﻿from fastapi import HTTPException, status, Depends
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from fastapi.security import HTTPBasic, HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
+import logging
 import secrets
-from database import get_db_connection
-from security import verify_password
+from database import get_async_db, init_async_pool
+from sessions import get_session_user
+from security import verify_password_async, hash_password_async, needs_rehash
+
+logger = logging.getLogger(__name__)
 
 security = HTTPBasic()
+bearer = HTTPBearer(auto_error=False)
+
+async def authenticate_user(username: str, password: str, conn) -> Optional[dict]:
+    user = await conn.fetchrow("""
+        SELECT u.id, u.username, u.password, u.first_name, u.surname, r.role_name 
+        FROM users u 
+        JOIN roles r ON u.role_id = r.id 
+        WHERE u.username = $1
+    """, username)
+    
+    if user and await verify_password_async(password, user['password']):
+        if needs_rehash(user['password']):
+            # Пароль известен только в момент входа, поэтому стоимость хэша обновляем здесь.
+            # Это необязательный шаг: ошибка пула bcrypt или БД не должна мешать входу
+            try:
+                new_hash = await hash_password_async(password)
+                await conn.execute("UPDATE users SET password = $1 WHERE id = $2", new_hash, user['id'])
+            except Exception as e:
+                logger.error(f"❌ Не удалось обновить хэш пароля пользователя {user['id']}: {e}")
 
-def authenticate_user(username: str, password: str, conn) -> Optional[dict]:
-    with conn.cursor() as cur:
-        cur.execute("""
-            SELECT u.id, u.username, u.password, u.first_name, u.surname, r.role_name 
-            FROM users u 
-            JOIN roles r ON u.role_id = r.id 
-            WHERE u.username = %s
-        """, (username,))
-        user = cur.fetchone()
-        
-        if user and verify_password(password, user['password']):
-            return {
-                'id': user['id'],
-                'username': user['username'],
-                'first_name': user['first_name'],
-                'surname': user['surname'],
-                'role': user['role_name']
-            }
+        return {
+            'id': user['id'],
+            'username': user['username'],
+            'first_name': user['first_name'],
+            'surname': user['surname'],
+            'role': user['role_name']
+        }
     return None
+
+async def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer)) -> dict:
+    """
+    Зависимость для защищенных маршрутов: пользователь по токену сессии.
+    Соединение с БД берется только при промахе кэша сессий.
+    """
+    user = None
+    if credentials:
+        pool = await init_async_pool()
+        user = await get_session_user(pool, credentials.credentials)
+
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Требуется авторизация",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
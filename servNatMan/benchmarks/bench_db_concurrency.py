@@ -0,0 +1,119 @@
+# bench_db_concurrency.py
+"""
+Сравнение пропускной способности: блокирующий psycopg2 внутри async-обработчика
+(как было) против asyncpg с пулом (как стало).
+
+Запуск из папки servNatMan при работающем локальном Postgres:
+    python benchmarks/bench_db_concurrency.py --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import asyncpg
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from database import DB_CONFIG, ASYNC_POOL_CONFIG
+
+MARKS_QUERY = """
+    SELECT m.*, u.username as creator_username 
+    FROM marks m 
+    LEFT JOIN users u ON m.user_id = u.id 
+    ORDER BY m.created_at DESC
+    LIMIT 100
+"""
+
+
+async def loop_lag_probe(stop: asyncio.Event, lags: list):
+    """Измеряет, насколько event loop опаздывает с пробуждением"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.005)
+        lags.append(time.perf_counter() - start - 0.005)
+
+
+async def run(handler, total: int, concurrency: int) -> dict:
+    latencies = []
+    lags = []
+    semaphore = asyncio.Semaphore(concurrency)
+    stop = asyncio.Event()
+    probe = asyncio.create_task(loop_lag_probe(stop, lags))
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await handler()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+
+    latencies.sort()
+    return {
+        'rps': total / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        'max_loop_lag_ms': max(lags, default=0.0) * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк sync vs async доступа к БД")
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--sleep', type=float, default=0.0,
+                        help="добавить pg_sleep(N) к запросу, чтобы имитировать медленный запрос")
+    args = parser.parse_args()
+
+    query = MARKS_QUERY
+    if args.sleep:
+        query = f"SELECT pg_sleep({args.sleep}); " + MARKS_QUERY
+
+    # Было: новое соединение и блокирующие вызовы прямо в event loop
+    async def blocking_handler():
+        conn = psycopg2.connect(**DB_CONFIG, cursor_factory=RealDictCursor)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(query)
+                cur.fetchall()
+        finally:
+            conn.close()
+
+    # Стало: asyncpg и пул соединений
+    pool = await asyncpg.create_pool(
+        database=DB_CONFIG["dbname"],
+        user=DB_CONFIG["user"],
+        password=DB_CONFIG["password"],
+        host=DB_CONFIG["host"],
+        port=DB_CONFIG["port"],
+        min_size=ASYNC_POOL_CONFIG["min_size"],
+        max_size=ASYNC_POOL_CONFIG["max_size"],
+    )
+
+    async def async_handler():
+        async with pool.acquire() as conn:
+            if args.sleep:
+                await conn.execute(f"SELECT pg_sleep({args.sleep})")
+            await conn.fetch(MARKS_QUERY)
+
+    print(f"📊 {args.requests} запросов, параллельность {args.concurrency}, pg_sleep={args.sleep}")
+    for name, handler in (('psycopg2 (блокирующий)', blocking_handler), ('asyncpg (пул)', async_handler)):
+        result = await run(handler, args.requests, args.concurrency)
+        print(f"   {name:24s} {result['rps']:8.1f} req/s   "
+              f"p50 {result['p50_ms']:7.2f} ms   p95 {result['p95_ms']:7.2f} ms   "
+              f"max lag {result['max_loop_lag_ms']:7.2f} ms")
+
+    await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
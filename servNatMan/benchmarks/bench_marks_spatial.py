@@ -0,0 +1,128 @@
+# bench_marks_spatial.py
+"""
+Бенчмарк запросов bbox / радиуса по меткам: B-tree (longitude, latitude) против
+GiST по point(longitude, latitude).
+
+Данные генерируются во временной таблице bench_marks, рабочая таблица marks не трогается.
+Запуск из папки servNatMan при работающем локальном Postgres:
+    python benchmarks/bench_marks_spatial.py --sizes 100000 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import psycopg2
+
+from database import DB_CONFIG
+from geo import radius_bbox, HAVERSINE_SQL
+
+# Область вокруг Москвы, где распределены тестовые метки
+AREA = (36.8, 55.1, 38.4, 56.3)
+
+BBOX_SQL = """
+    SELECT count(*) FROM bench_marks m
+    WHERE point(m.longitude, m.latitude) <@ box(point(%s, %s), point(%s, %s))
+"""
+BTREE_BBOX_SQL = """
+    SELECT count(*) FROM bench_marks m
+    WHERE m.longitude BETWEEN %s AND %s AND m.latitude BETWEEN %s AND %s
+"""
+RADIUS_SQL = f"""
+    SELECT count(*) FROM bench_marks m
+    WHERE point(m.longitude, m.latitude) <@ box(point(%(x1)s, %(y1)s), point(%(x2)s, %(y2)s))
+      AND {HAVERSINE_SQL.format(lat='%(lat)s', lon='%(lon)s')} <= %(radius)s
+"""
+BTREE_RADIUS_SQL = f"""
+    SELECT count(*) FROM bench_marks m
+    WHERE m.longitude BETWEEN %(x1)s AND %(x2)s AND m.latitude BETWEEN %(y1)s AND %(y2)s
+      AND {HAVERSINE_SQL.format(lat='%(lat)s', lon='%(lon)s')} <= %(radius)s
+"""
+
+
+def fill_table(cur, size: int):
+    cur.execute("DROP TABLE IF EXISTS bench_marks")
+    cur.execute("""
+        CREATE UNLOGGED TABLE bench_marks (
+            id SERIAL PRIMARY KEY,
+            longitude DOUBLE PRECISION NOT NULL,
+            latitude DOUBLE PRECISION NOT NULL
+        )
+    """)
+    cur.execute("""
+        INSERT INTO bench_marks (longitude, latitude)
+        SELECT %s + random() * %s, %s + random() * %s FROM generate_series(1, %s)
+    """, (AREA[0], AREA[2] - AREA[0], AREA[1], AREA[3] - AREA[1], size))
+
+
+def time_queries(cur, sql: str, params_list: list) -> float:
+    start = time.perf_counter()
+    for params in params_list:
+        cur.execute(sql, params)
+        cur.fetchone()
+    return (time.perf_counter() - start) / len(params_list) * 1000
+
+
+def random_viewports(count: int, span: float) -> list:
+    result = []
+    for _ in range(count):
+        lon = random.uniform(AREA[0], AREA[2] - span)
+        lat = random.uniform(AREA[1], AREA[3] - span)
+        result.append((lon, lat, lon + span, lat + span))
+    return result
+
+
+def random_circles(count: int, radius: float) -> list:
+    result = []
+    for _ in range(count):
+        lat = random.uniform(AREA[1], AREA[3])
+        lon = random.uniform(AREA[0], AREA[2])
+        # AREA далеко от меридиана ±180, прямоугольник всегда один
+        (x1, y1, x2, y2), = radius_bbox(lat, lon, radius)
+        result.append({'lat': lat, 'lon': lon, 'radius': radius, 'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2})
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк пространственных запросов по меткам")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--span', type=float, default=0.02, help="размер bbox в градусах")
+    parser.add_argument('--radius', type=float, default=1000.0, help="радиус в метрах")
+    args = parser.parse_args()
+
+    random.seed(42)
+    conn = psycopg2.connect(**DB_CONFIG)
+    conn.autocommit = True
+    cur = conn.cursor()
+
+    viewports = random_viewports(args.queries, args.span)
+    bbox_params = [(x1, y1, x2, y2) for x1, y1, x2, y2 in viewports]
+    btree_params = [(x1, x2, y1, y2) for x1, y1, x2, y2 in viewports]
+    circles = random_circles(args.queries, args.radius)
+
+    try:
+        for size in args.sizes:
+            print(f"\n📊 {size} меток")
+            fill_table(cur, size)
+
+            cur.execute("CREATE INDEX bench_marks_btree ON bench_marks (longitude, latitude)")
+            cur.execute("ANALYZE bench_marks")
+            print(f"   B-tree bbox:   {time_queries(cur, BTREE_BBOX_SQL, btree_params):8.3f} ms/запрос")
+            print(f"   B-tree радиус: {time_queries(cur, BTREE_RADIUS_SQL, circles):8.3f} ms/запрос")
+
+            cur.execute("DROP INDEX bench_marks_btree")
+            cur.execute("CREATE INDEX ON bench_marks USING gist (point(longitude, latitude))")
+            cur.execute("ANALYZE bench_marks")
+            print(f"   GiST bbox:     {time_queries(cur, BBOX_SQL, bbox_params):8.3f} ms/запрос")
+            print(f"   GiST радиус:   {time_queries(cur, RADIUS_SQL, circles):8.3f} ms/запрос")
+    finally:
+        cur.execute("DROP TABLE IF EXISTS bench_marks")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
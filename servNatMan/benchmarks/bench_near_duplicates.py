@@ -0,0 +1,113 @@
+# bench_near_duplicates.py
+"""
+Бенчмарк индекса почти-дублей: доля попаданий и время поиска на 100k записей,
+плюс устойчивость dHash к пережатию/обрезке на реальных фото датасета.
+
+Запуск из папки servNatMan:
+    python benchmarks/bench_near_duplicates.py --entries 100000
+    python benchmarks/bench_near_duplicates.py --dataset ../CVnatman/statue_dataset
+"""
+import argparse
+import io
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from PIL import Image
+
+from near_duplicates import NearDuplicateIndex, NEAR_DUPLICATE_CONFIG, HASH_BITS, dhash
+
+VERSION = "bench"
+
+
+def flip_bits(value: int, count: int) -> int:
+    for bit in random.sample(range(HASH_BITS), count):
+        value ^= 1 << bit
+    return value
+
+
+def bench_index(entries: int, queries: int, max_distance: int):
+    index = NearDuplicateIndex(max_distance=max_distance, maxsize=entries)
+    hashes = [random.getrandbits(HASH_BITS) for _ in range(entries)]
+
+    start = time.perf_counter()
+    for value in hashes:
+        index.add(value, VERSION, {'success': True, 'objects': []})
+    print(f"📥 Заполнение {entries} записей: {time.perf_counter() - start:.2f} с")
+
+    cases = [(f"{d} бит отличия", d) for d in range(max_distance + 2)] + [("случайный хэш", None)]
+    for name, distance in cases:
+        timings = []
+        hits = 0
+        for _ in range(queries):
+            if distance is None:
+                query = random.getrandbits(HASH_BITS)
+            else:
+                query = flip_bits(random.choice(hashes), distance)
+            start = time.perf_counter()
+            hits += index.lookup(query, VERSION) is not None
+            timings.append((time.perf_counter() - start) * 1e6)
+        timings.sort()
+        print(f"   {name:16s} попаданий {hits / queries:7.2%}   "
+              f"среднее {statistics.mean(timings):7.1f} мкс   p99 {timings[int(len(timings) * 0.99) - 1]:7.1f} мкс")
+
+    # Для сравнения: полный перебор
+    sample = [random.getrandbits(HASH_BITS) for _ in range(20)]
+    start = time.perf_counter()
+    for query in sample:
+        min(bin(query ^ value).count('1') for value in hashes)
+    print(f"   полный перебор   среднее {(time.perf_counter() - start) / len(sample) * 1e6:7.1f} мкс")
+
+
+def transformations(image: Image.Image):
+    width, height = image.size
+
+    def jpeg(img, quality):
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=quality)
+        return Image.open(io.BytesIO(buffer.getvalue()))
+
+    yield "JPEG q=60", jpeg(image, 60)
+    yield "уменьшение x0.5", image.resize((width // 2, height // 2))
+    yield "обрезка 5%", image.crop((width // 20, height // 20, width - width // 20, height - height // 20))
+    yield "обрезка 10%", image.crop((width // 10, height // 10, width - width // 10, height - height // 10))
+
+
+def bench_dataset(dataset_dir: str, max_distance: int):
+    distances = {}
+    for root, _, files in os.walk(dataset_dir):
+        for name in files:
+            if not name.lower().endswith(('.jpg', '.jpeg', '.png')):
+                continue
+            with Image.open(os.path.join(root, name)) as img:
+                image = img.convert('RGB')
+            original = dhash(image)
+            for label, transformed in transformations(image):
+                distances.setdefault(label, []).append(bin(original ^ dhash(transformed)).count('1'))
+
+    print(f"\n🖼️ Устойчивость dHash (порог {max_distance}):")
+    for label, values in distances.items():
+        matched = sum(d <= max_distance for d in values) / len(values)
+        print(f"   {label:16s} в пределах порога {matched:7.2%}   среднее расстояние {statistics.mean(values):.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк индекса почти-дублей")
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--max-distance', type=int, default=NEAR_DUPLICATE_CONFIG["max_distance"])
+    parser.add_argument('--dataset', help="папка с изображениями для проверки устойчивости хэша")
+    args = parser.parse_args()
+
+    random.seed(42)
+    bench_index(args.entries, args.queries, args.max_distance)
+    if args.dataset:
+        bench_dataset(args.dataset, args.max_distance)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# bench_recognition_upload.py
+"""
+Сравнение способов отправки фото на распознавание: base64 в JSON (/statues/recognize),
+multipart (/statues/recognize-upload) и сырое тело image/jpeg (/statues/recognize-raw).
+
+К каждому запросу в конец JPEG дописываются случайные байты (декодер их игнорирует),
+чтобы кэш распознавания не срабатывал и все способы делали одинаковую работу.
+
+Запуск при работающем сервере:
+    python benchmarks/bench_recognition_upload.py --url http://localhost:8000 --image photo.jpg
+"""
+import argparse
+import base64
+import os
+import statistics
+import time
+
+import httpx
+
+
+def unique(image_bytes: bytes) -> bytes:
+    return image_bytes + os.urandom(16)
+
+
+def send_base64(client, url, image_bytes):
+    payload = base64.b64encode(image_bytes).decode('ascii')
+    return client.post(f"{url}/statues/recognize", json={"image": payload}), len(payload) + 12
+
+
+def send_multipart(client, url, image_bytes):
+    files = {"file": ("photo.jpg", image_bytes, "image/jpeg")}
+    return client.post(f"{url}/statues/recognize-upload", files=files), len(image_bytes)
+
+
+def send_raw(client, url, image_bytes):
+    response = client.post(
+        f"{url}/statues/recognize-raw",
+        content=image_bytes,
+        headers={"Content-Type": "image/jpeg"},
+    )
+    return response, len(image_bytes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк способов загрузки фото")
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--image', required=True)
+    parser.add_argument('--requests', type=int, default=30)
+    args = parser.parse_args()
+
+    with open(args.image, 'rb') as f:
+        image_bytes = f.read()
+    print(f"📷 {args.image}: {len(image_bytes) / 1024:.0f} КБ")
+
+    with httpx.Client(timeout=60) as client:
+        for name, sender in (('base64 JSON', send_base64), ('multipart', send_multipart), ('raw image/jpeg', send_raw)):
+            timings = []
+            sent = 0
+            for _ in range(args.requests):
+                start = time.perf_counter()
+                response, size = sender(client, args.url, unique(image_bytes))
+                timings.append((time.perf_counter() - start) * 1000)
+                response.raise_for_status()
+                sent = size
+            print(f"   {name:15s} тело ~{sent / 1024:7.0f} КБ   "
+                  f"медиана {statistics.median(timings):7.1f} ms   макс {max(timings):7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
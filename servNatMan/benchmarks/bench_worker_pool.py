@@ -0,0 +1,161 @@
+# bench_worker_pool.py
+"""
+Память и пропускная способность: N процессов, каждый со своей моделью (как N воркеров
+uvicorn), против пула из N процессов инференса с общим mmap модели и батчами
+через разделяемую память (WorkerPoolBackend).
+
+Память считается как PSS (/proc/<pid>/smaps_rollup): общие страницы делятся
+между процессами, поэтому сумма PSS - реальный расход памяти. В обоих вариантах
+это пик суммы по замерам раз в 0.5 с во время нагрузки. Только Linux.
+
+Запуск из папки servNatMan:
+    python benchmarks/bench_worker_pool.py --processes 4 --backend tflite
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+
+from statue_recognition import CV_DIR  # noqa: F401 - добавляет CVnatman в sys.path
+from statue_inference import IMAGE_SIZE, WorkerPoolBackend, load_backend
+
+
+def pss_mb(pid) -> float:
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        # Процесс уже завершился
+        pass
+    return 0.0
+
+
+class PssSampler:
+    """Пик суммарного PSS процессов: замер в фоновом потоке, пока идет нагрузка"""
+
+    def __init__(self, pids, interval=0.5):
+        self.pids = list(pids)
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, sum(pss_mb(pid) for pid in self.pids))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def random_batch(batch_size):
+    rng = np.random.default_rng(0)
+    return rng.random((batch_size, IMAGE_SIZE[1], IMAGE_SIZE[0], 3), dtype=np.float32)
+
+
+def backend_kwargs(backend, threads):
+    return {"num_threads": threads} if backend == 'tflite' else {}
+
+
+def standalone_worker(model_dir, backend, batch_size, duration, start_event, queue):
+    """Один воркер API со своей копией модели"""
+    model = load_backend(backend, model_dir, **backend_kwargs(backend, 1))
+    batch = random_batch(batch_size)
+    model.predict(batch)
+    queue.put(('ready', os.getpid()))
+    start_event.wait()
+
+    images = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        model.predict(batch)
+        images += batch_size
+    queue.put(('done', images))
+
+
+def bench_standalone(model_dir, backend, processes, batch_size, duration):
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    start_event = ctx.Event()
+    workers = [
+        ctx.Process(target=standalone_worker, args=(model_dir, backend, batch_size, duration, start_event, queue))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for _ in workers:
+        queue.get()
+
+    with PssSampler(worker.pid for worker in workers) as sampler:
+        start = time.perf_counter()
+        start_event.set()
+        results = [queue.get() for _ in workers]
+        elapsed = time.perf_counter() - start
+    for worker in workers:
+        worker.join()
+
+    images = sum(result[1] for result in results)
+    return images / elapsed, sampler.peak
+
+
+def bench_pool(model_dir, backend, processes, batch_size, duration):
+    pool = WorkerPoolBackend(model_dir, backend, processes=processes, max_batch_size=batch_size,
+                             **backend_kwargs(backend, 1))
+    batch = random_batch(batch_size)
+    pool.predict(batch)
+
+    counts = [0] * pool.lanes
+    deadline = time.perf_counter() + duration
+
+    def client(i):
+        while time.perf_counter() < deadline:
+            pool.predict(batch)
+            counts[i] += batch_size
+
+    # По клиентскому потоку на дорожку: как потоки BatchScheduler в процессе API
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(pool.lanes)]
+    # Процесс API (этот) тоже считается: в нем разделяемая память и клиентские потоки
+    with PssSampler([os.getpid(), *pool.pids]) as sampler:
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+    pool.close()
+    return sum(counts) / elapsed, sampler.peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк пула процессов инференса")
+    parser.add_argument('--model-dir', default='../models')
+    parser.add_argument('--backend', default='tflite')
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20.0)
+    args = parser.parse_args()
+
+    print(f"🧪 {args.processes} процессов, бэкенд {args.backend}, батч {args.batch_size}, {args.duration:.0f} с")
+    for name, bench in (("модель в каждом воркере", bench_standalone), ("пул с общей моделью", bench_pool)):
+        throughput, total_pss = bench(args.model_dir, args.backend, args.processes, args.batch_size, args.duration)
+        print(f"   {name:24s} {throughput:8.1f} изобр./с   "
+              f"PSS всего {total_pss:7.0f} МБ   на ядро {total_pss / args.processes:6.0f} МБ")
+
+
+if __name__ == "__main__":
+    main()
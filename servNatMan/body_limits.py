@@ -0,0 +1,80 @@
+# body_limits.py
+import json
+from typing import Dict
+
+from fastapi import HTTPException
+
+
+class BodyTooLarge(HTTPException):
+    """
+    Наследуется от HTTPException: FastAPI пропускает его из разбора тела запроса
+    как есть и отвечает 413, а не общим 400 "error parsing the body"
+    """
+
+    def __init__(self, limit: int):
+        super().__init__(status_code=413, detail=_limit_message(limit))
+
+
+def _limit_message(limit: int) -> str:
+    return f"Слишком большой запрос (максимум {limit // 1024 // 1024} МБ)"
+
+
+class BodySizeLimitMiddleware:
+    """
+    ASGI middleware: ограничивает размер тела запроса для заданных путей.
+    Размер проверяется по Content-Length сразу и по мере чтения потока, так что
+    огромная или chunked загрузка обрывается с 413, не дойдя до памяти целиком.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope.get("path")) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            await self._reject(send, limit)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise BodyTooLarge(limit)
+            return message
+
+        async def tracked_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except BodyTooLarge:
+            if not response_started:
+                await self._reject(send, limit)
+
+    @staticmethod
+    async def _reject(send, limit: int):
+        body = json.dumps({"detail": _limit_message(limit)}, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,5 +1,14 @@
-﻿import psycopg2
+﻿import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+
+import asyncpg
+import psycopg2
+from psycopg2 import extensions
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+from fastapi import HTTPException
 
 DB_CONFIG = {
     "dbname": "lykomor",
@@ -9,6 +18,20 @@ DB_CONFIG = {
     "port": 5432
 }
 
+POOL_CONFIG = {
+    "minconn": 2,
+    "maxconn": 20,
+    "checkout_timeout": 5.0,        # сколько секунд ждать свободное соединение
+    "health_check_interval": 30.0,  # пинговать соединение, простоявшее дольше
+}
+
+ASYNC_POOL_CONFIG = {
+    "min_size": 2,
+    "max_size": 20,
+    "checkout_timeout": 5.0,
+    "max_inactive_connection_lifetime": 300.0,
+}
+
 CREATE_TABLES_QUERIES = [
     """
     CREATE TABLE IF NOT EXISTS roles (
@@ -46,6 +69,14 @@ CREATE_TABLES_QUERIES = [
     );
     """,
     """
+    CREATE TABLE IF NOT EXISTS sessions (
+        token_hash CHAR(64) PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        created_at TIMESTAMPTZ DEFAULT NOW(),
+        expires_at TIMESTAMPTZ NOT NULL
+    );
+    """,
+    """
     CREATE TABLE IF NOT EXISTS marks (
         id SERIAL PRIMARY KEY,
         user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
@@ -54,7 +85,7 @@ CREATE_TABLES_QUERIES = [
         mark_name VARCHAR(150) UNIQUE,
         description TEXT,
         address TEXT,
-        created_at TIMESTAMPTZ DEFAULT NOW(),
+        created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
         updated_at TIMESTAMPTZ DEFAULT NOW(),
         is_active BOOLEAN DEFAULT TRUE,
         CONSTRAINT uq_coordinates UNIQUE (longitude, latitude)
@@ -119,9 +150,52 @@ CREATE_TABLES_QUERIES = [
     );
     """,
     """
+    CREATE TABLE IF NOT EXISTS table_versions (
+        table_name VARCHAR(63) PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+    """,
+    """
+    CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO table_versions (table_name, version, updated_at)
+        VALUES (TG_TABLE_NAME, 1, NOW())
+        ON CONFLICT (table_name) DO UPDATE
+            SET version = table_versions.version + 1, updated_at = NOW();
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    DROP TRIGGER IF EXISTS trg_marks_version ON marks;
+    CREATE TRIGGER trg_marks_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON marks
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+    """,
+    """
+    DROP TRIGGER IF EXISTS trg_users_version ON users;
+    CREATE TRIGGER trg_users_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON users
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+    """,
+    """
     CREATE INDEX IF NOT EXISTS idx_marks_location ON marks (longitude, latitude);
     """,
     """
+    CREATE INDEX IF NOT EXISTS idx_marks_active_geo ON marks USING gist (point(longitude, latitude))
+        WHERE is_active;
+    """,
+    """
+    -- Курсор списка меток - (created_at, id): NULL в created_at ломал бы сравнение строк
+    UPDATE marks SET created_at = COALESCE(updated_at, NOW()) WHERE created_at IS NULL;
+    ALTER TABLE marks ALTER COLUMN created_at SET NOT NULL;
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_marks_active_created ON marks (created_at DESC, id DESC)
+        WHERE is_active;
+    """,
+    """
     CREATE INDEX IF NOT EXISTS idx_games_active ON games(start_time DESC);
     """,
     """
@@ -132,6 +206,12 @@ CREATE_TABLES_QUERIES = [
     """,
     """
     CREATE INDEX IF NOT EXISTS idx_game_marks_game ON game_marks(game_id);
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id);
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at);
     """
 ]
 
@@ -150,6 +230,12 @@ def create_tables():
             ON CONFLICT (role_name) DO NOTHING;
         """)
 
+        cur.execute("""
+            INSERT INTO table_versions (table_name) VALUES 
+            ('marks'), ('users')
+            ON CONFLICT (table_name) DO NOTHING;
+        """)
+
         conn.commit()
         cur.close()
         print("Все таблицы успешно созданы!")
@@ -162,9 +248,218 @@ def create_tables():
         if conn:
             conn.close()
 
+class PoolTimeoutError(Exception):
+    """Свободное соединение не появилось за checkout_timeout"""
+
+
+class PooledConnection(extensions.connection):
+    """Соединение пула: помнит, когда его последний раз вернули в пул"""
+    last_used = None
+
+
+class DatabasePool:
+    """Пул соединений PostgreSQL с ограничением размера и проверкой соединений"""
+
+    def __init__(self, minconn: int, maxconn: int, checkout_timeout: float,
+                 health_check_interval: float, **conn_kwargs):
+        # Время возврата хранится на самом соединении: id() закрытого соединения
+        # может достаться новому, и оно пропустило бы проверку
+        conn_kwargs.setdefault("connection_factory", PooledConnection)
+        self._pool = ThreadedConnectionPool(minconn, maxconn, **conn_kwargs)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+
+        self.in_use = 0
+        self.max_in_use = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.reconnects = 0
+        self.total_wait = 0.0
+
+    def _is_healthy(self, conn) -> bool:
+        """Проверка соединения: закрытые и сломанные отбрасываем, долго простоявшие пингуем"""
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+
+        last_used = getattr(conn, "last_used", None)
+        if last_used is not None and time.monotonic() - last_used < self.health_check_interval:
+            return True
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeoutError(
+                f"Нет свободных соединений с БД за {self.checkout_timeout} с"
+            )
+
+        try:
+            # Простаивающие соединения могли оборваться все сразу (перезапуск БД),
+            # поэтому проверяем и замену; новое соединение проверяется пингом
+            for _ in range(self.maxconn + 1):
+                conn = self._pool.getconn()
+                if self._is_healthy(conn):
+                    break
+                self._pool.putconn(conn, close=True)
+                with self._lock:
+                    self.reconnects += 1
+            else:
+                raise psycopg2.OperationalError("Не удалось получить рабочее соединение с БД")
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += time.monotonic() - start
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+        return conn
+
+    def putconn(self, conn):
+        try:
+            close = bool(conn.closed)
+            if not close and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+
+            if not close:
+                conn.last_used = time.monotonic()
+            self._pool.putconn(conn, close=close)
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def closeall(self):
+        self._pool.closeall()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "minconn": self.minconn,
+                "maxconn": self.maxconn,
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "idle": len(self._pool._pool),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "reconnects": self.reconnects,
+                "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def init_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DatabasePool(**POOL_CONFIG, **DB_CONFIG, cursor_factory=RealDictCursor)
+    return _pool
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+def get_pool_stats() -> dict:
+    if _pool is None:
+        return {"initialized": False}
+    return {"initialized": True, **_pool.stats()}
+
 def get_db_connection():
-    conn = psycopg2.connect(**DB_CONFIG, cursor_factory=RealDictCursor)
+    pool = _pool or init_pool()
+    try:
+        conn = pool.getconn()
+    except PoolTimeoutError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": "1"},
+        )
     try:
         yield conn
     finally:
-        conn.close()
+        pool.putconn(conn)
+
+
+_async_pool = None
+
+async def init_async_pool():
+    """Создание пула asyncpg (вызывается на старте приложения)"""
+    global _async_pool
+    if _async_pool is None:
+        _async_pool = await asyncpg.create_pool(
+            database=DB_CONFIG["dbname"],
+            user=DB_CONFIG["user"],
+            password=DB_CONFIG["password"],
+            host=DB_CONFIG["host"],
+            port=DB_CONFIG["port"],
+            min_size=ASYNC_POOL_CONFIG["min_size"],
+            max_size=ASYNC_POOL_CONFIG["max_size"],
+            max_inactive_connection_lifetime=ASYNC_POOL_CONFIG["max_inactive_connection_lifetime"],
+        )
+    return _async_pool
+
+async def close_async_pool():
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+
+def get_async_pool_stats() -> dict:
+    if _async_pool is None:
+        return {"initialized": False}
+    return {
+        "initialized": True,
+        "min_size": _async_pool.get_min_size(),
+        "max_size": _async_pool.get_max_size(),
+        "size": _async_pool.get_size(),
+        "idle": _async_pool.get_idle_size(),
+    }
+
+@asynccontextmanager
+async def async_db_connection():
+    """
+    Асинхронное соединение из пула asyncpg, не блокирует event loop.
+    Для обработчиков, которым соединение нужно не всегда (например, только при промахе кэша)
+    """
+    pool = _async_pool or await init_async_pool()
+    try:
+        conn = await pool.acquire(timeout=ASYNC_POOL_CONFIG["checkout_timeout"])
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Нет свободных соединений с БД за {ASYNC_POOL_CONFIG['checkout_timeout']} с",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+async def get_async_db():
+    """Зависимость FastAPI: соединение на время запроса"""
+    async with async_db_connection() as conn:
+        yield conn
@@ -0,0 +1,98 @@
+import math
+from typing import List, Tuple
+
+EARTH_RADIUS_M = 6371000.0
+# Тот же радиус, что в HAVERSINE_SQL: иначе прямоугольник отбора меньше круга
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+# Запас прямоугольника отбора на погрешность float (~1 см)
+BBOX_MARGIN_DEG = 1e-7
+
+# Точка метки для GiST-индекса idx_marks_active_geo: выражение должно совпадать с индексом
+MARK_POINT_SQL = "point(m.longitude, m.latitude)"
+
+# Расстояние по большой окружности от ($lat, $lon) до метки, в метрах;
+# least(1, ...) - аргумент asin из-за округления может чуть превысить 1
+HAVERSINE_SQL = (
+    f"2 * {EARTH_RADIUS_M:.0f} * asin(least(1, sqrt("
+    "power(sin(radians(m.latitude - {lat}) / 2), 2) + "
+    "cos(radians({lat})) * cos(radians(m.latitude)) * "
+    "power(sin(radians(m.longitude - {lon}) / 2), 2))))"
+)
+
+BBox = Tuple[float, float, float, float]
+
+
+def parse_bbox(value: str) -> BBox:
+    """'min_lon,min_lat,max_lon,max_lat' -> кортеж, ValueError при ошибке"""
+    parts = [float(p) for p in value.split(',')]
+    if len(parts) != 4:
+        raise ValueError("bbox должен содержать 4 числа: min_lon,min_lat,max_lon,max_lat")
+
+    min_lon, min_lat, max_lon, max_lat = parts
+    if not (-180 <= min_lon <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+        raise ValueError("bbox вне допустимого диапазона координат")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def parse_point(value: str) -> Tuple[float, float]:
+    """'lat,lon' -> кортеж (lat, lon), ValueError при ошибке"""
+    parts = [float(p) for p in value.split(',')]
+    if len(parts) != 2:
+        raise ValueError("near должен иметь вид lat,lon")
+
+    lat, lon = parts
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("near вне допустимого диапазона координат")
+    return lat, lon
+
+
+def radius_bbox(lat: float, lon: float, radius_m: float) -> List[BBox]:
+    """
+    Прямоугольники, гарантированно содержащие круг радиуса radius_m вокруг точки.
+    Круг, пересекающий меридиан ±180, дает два прямоугольника по разные его стороны.
+    """
+    angle = radius_m / EARTH_RADIUS_M  # угловой радиус круга, радианы
+    dlat = math.degrees(angle) + BBOX_MARGIN_DEG
+    min_lat = max(-90.0, lat - dlat)
+    max_lat = min(90.0, lat + dlat)
+    cos_lat = math.cos(math.radians(lat))
+    if min_lat == -90.0 or max_lat == 90.0 or math.sin(angle) >= cos_lat:
+        # Круг накрывает полюс - подходят все долготы
+        return [(-180.0, min_lat, 180.0, max_lat)]
+
+    # Точная полуширина по долготе: крайние точки круга лежат ближе к полюсу,
+    # чем центр, поэтому radius / cos(lat) занижает ее
+    dlon = math.degrees(math.asin(math.sin(angle) / cos_lat)) + BBOX_MARGIN_DEG
+    if dlon >= 180.0:
+        return [(-180.0, min_lat, 180.0, max_lat)]
+
+    min_lon, max_lon = lon - dlon, lon + dlon
+    if min_lon < -180.0:
+        return [(min_lon + 360.0, min_lat, 180.0, max_lat), (-180.0, min_lat, max_lon, max_lat)]
+    if max_lon > 180.0:
+        return [(min_lon, min_lat, 180.0, max_lat), (-180.0, min_lat, max_lon - 360.0, max_lat)]
+    return [(min_lon, min_lat, max_lon, max_lat)]
+
+
+def bbox_filter(bbox: BBox, first_param: int) -> Tuple[str, list]:
+    """Условие WHERE, которое обслуживается GiST-индексом по точке метки"""
+    n = first_param
+    sql = f"{MARK_POINT_SQL} <@ box(point(${n}, ${n + 1}), point(${n + 2}, ${n + 3}))"
+    return sql, list(bbox)
+
+
+def bboxes_filter(bboxes: List[BBox], first_param: int) -> Tuple[str, list]:
+    """Условие для нескольких прямоугольников (OR), каждый обслуживается тем же индексом"""
+    parts = []
+    params = []
+    for bbox in bboxes:
+        sql, values = bbox_filter(bbox, first_param + len(params))
+        parts.append(sql)
+        params.extend(values)
+    if len(parts) == 1:
+        return parts[0], params
+    return f"({' OR '.join(parts)})", params
+
+
+def distance_sql(lat_param: int, lon_param: int) -> str:
+    return HAVERSINE_SQL.format(lat=f"${lat_param}", lon=f"${lon_param}")
@@ -0,0 +1,86 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional, Sequence, Tuple
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    """Сильный ETag из произвольных частей (версия, id, параметры запроса)"""
+    digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+    return f'"{digest}"'
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def _opaque_tag(tag: str) -> str:
+    # Слабое сравнение (RFC 9110, 8.8.3.2): префикс W/ не учитывается
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """Проверка If-None-Match (слабое сравнение), а при его отсутствии If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [_opaque_tag(tag) for tag in if_none_match.split(',')]
+        return "*" in tags or _opaque_tag(etag) in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime] = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def conditional(request: Request, response: Response, etag: str,
+                last_modified: Optional[datetime] = None) -> Optional[Response]:
+    """
+    Возвращает готовый ответ 304, если у клиента актуальная копия;
+    иначе проставляет валидаторы в response и возвращает None
+    """
+    headers = validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+async def table_version(conn, table_name: str) -> Tuple[int, Optional[datetime]]:
+    """Версия таблицы из table_versions, увеличивается триггером при каждой записи"""
+    row = await conn.fetchrow(
+        "SELECT version, updated_at FROM table_versions WHERE table_name = $1", table_name
+    )
+    if not row:
+        return 0, None
+    return row['version'], row['updated_at']
+
+
+async def tables_version(conn, table_names: Sequence[str]) -> Tuple[tuple, Optional[datetime]]:
+    """
+    Версии нескольких таблиц (для ответов с JOIN) одним запросом:
+    кортеж версий в порядке table_names и самое позднее время изменения
+    """
+    rows = await conn.fetch(
+        "SELECT table_name, version, updated_at FROM table_versions WHERE table_name = ANY($1::text[])",
+        list(table_names)
+    )
+    found = {row['table_name']: row for row in rows}
+    versions = tuple(found[name]['version'] if name in found else 0 for name in table_names)
+    updated = [row['updated_at'] for row in rows if row['updated_at'] is not None]
+    return versions, max(updated) if updated else None
@@ -0,0 +1,192 @@
+# inference.py
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+
+from statue_recognition import NOT_LOADED_ERROR
+from model_registry import model_registry
+from recognition_cache import recognition_cache
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_CONFIG = {
+    "max_batch_size": 16,  # сколько изображений максимум в одном вызове модели
+    "max_wait_ms": 10,     # сколько ждать попутчиков для первого запроса в батче
+    "workers": 1,          # сколько батчей считается одновременно
+    "max_queue": 64,       # сверх этого запросы сразу получают 503
+}
+
+
+class InferenceStats:
+    """Счетчики времени ожидания в очереди и времени вычислений"""
+
+    def __init__(self):
+        self.requests = 0
+        self.rejected = 0
+        self.batches = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.compute_total = 0.0
+        self.compute_max = 0.0
+
+    def record_batch(self, queue_waits: List[float], compute: float):
+        self.batches += 1
+        self.requests += len(queue_waits)
+        self.queue_wait_total += sum(queue_waits)
+        self.queue_wait_max = max(self.queue_wait_max, max(queue_waits))
+        self.compute_total += compute
+        self.compute_max = max(self.compute_max, compute)
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "avg_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "avg_queue_wait_ms": round(self.queue_wait_total / self.requests * 1000, 2) if self.requests else 0.0,
+            "max_queue_wait_ms": round(self.queue_wait_max * 1000, 2),
+            "avg_compute_ms": round(self.compute_total / self.batches * 1000, 2) if self.batches else 0.0,
+            "max_compute_ms": round(self.compute_max * 1000, 2),
+        }
+
+
+class BatchScheduler:
+    """
+    Собирает одновременные запросы распознавания в батчи и считает их в отдельном
+    пуле потоков, чтобы декодирование и TensorFlow не занимали event loop.
+    Версию модели запрос получает из реестра при постановке в очередь и держит до ответа,
+    поэтому замена модели не обрывает запросы, которые уже ждут.
+    """
+
+    def __init__(self, registry, max_batch_size: int, max_wait_ms: float,
+                 workers: int, max_queue: int, cache=None):
+        self.registry = registry
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.workers = workers
+        self.max_queue = max_queue
+        self.stats = InferenceStats()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+        self._queue = None
+        self._slots = None
+        self._worker = None
+
+    def _ensure_started(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.workers)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def predict(self, image_data: bytes, version: Optional[str] = None,
+                      reserved: bool = False) -> Dict:
+        """reserved - место в очереди уже проверено для всего запроса (predict_many)"""
+        recognizer = self.registry.acquire(version)
+        if recognizer is None:
+            if version is not None and self.registry.is_loaded:
+                raise HTTPException(status_code=404, detail=f"Версия модели {version} не загружена")
+            return {'success': False, 'error': NOT_LOADED_ERROR}
+
+        try:
+            key = None
+            if self.cache is not None:
+                key = self.cache.make_key(image_data, recognizer.model_version)
+                cached = await self.cache.get(key)
+                if cached is not None:
+                    return cached
+
+            started = time.perf_counter()
+            result = await self._enqueue(recognizer, image_data, check_capacity=not reserved)
+            self.registry.record(recognizer, time.perf_counter() - started, result)
+            if key is not None and result.get('success'):
+                self.cache.set(key, result)
+            return result
+        finally:
+            self.registry.release(recognizer)
+
+    def _check_capacity(self, count: int = 1):
+        if self._queue.qsize() + count > self.max_queue:
+            self.stats.rejected += count
+            raise HTTPException(
+                status_code=503,
+                detail="Сервер распознавания перегружен, повторите попытку позже",
+                headers={"Retry-After": "1"},
+            )
+
+    async def _enqueue(self, recognizer, image_data: bytes, check_capacity: bool = True) -> Dict:
+        self._ensure_started()
+        if check_capacity:
+            self._check_capacity()
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        await self._queue.put((recognizer, image_data, future, loop.time()))
+        return await future
+
+    async def predict_many(self, images: List[bytes], version: Optional[str] = None) -> List[Dict]:
+        # Место проверяется один раз на весь запрос: иначе он получал бы 503 посередине,
+        # а уже поставленные в очередь изображения считались бы впустую
+        self._ensure_started()
+        self._check_capacity(len(images))
+        return list(await asyncio.gather(*(self.predict(image, version, reserved=True) for image in images)))
+
+    def queue_size(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def _collect_batch(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            # Пока все воркеры заняты, запросы копятся в очереди и следующий батч будет крупнее
+            await self._slots.acquire()
+            batch = await self._collect_batch()
+            asyncio.get_running_loop().create_task(self._process(batch))
+
+    async def _process(self, batch: list):
+        try:
+            # При A/B-разделении в одной выборке бывают разные версии: каждой свой вызов модели
+            groups: Dict[object, list] = {}
+            for item in batch:
+                groups.setdefault(item[0], []).append(item)
+            for recognizer, group in groups.items():
+                await self._process_group(recognizer, group)
+        finally:
+            self._slots.release()
+
+    async def _process_group(self, recognizer, batch: list):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        images = [image for _, image, _, _ in batch]
+
+        try:
+            compute_start = time.perf_counter()
+            results = await loop.run_in_executor(self._executor, recognizer.predict_batch, images)
+            compute = time.perf_counter() - compute_start
+            self.stats.record_batch([started - enqueued for _, _, _, enqueued in batch], compute)
+        except Exception as e:
+            logger.error(f"❌ Ошибка пакетного распознавания: {e}")
+            results = [{'success': False, 'error': str(e)}] * len(batch)
+
+        for (_, _, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+recognition_scheduler = BatchScheduler(model_registry, **INFERENCE_CONFIG, cache=recognition_cache)
@@ -1,12 +1,17 @@
 ﻿from fastapi import FastAPI, HTTPException, Depends, status
-from fastapi.security import HTTPBasicCredentials
+from fastapi.security import HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-import secrets
 import uvicorn
 
-from database import create_tables, get_db_connection
+from database import (
+    create_tables, init_pool, close_pool, get_pool_stats,
+    get_async_db, init_async_pool, close_async_pool, get_async_pool_stats
+)
 from models import UserLogin, AuthResponse
-from authorization import authenticate_user, security
+from authorization import authenticate_user, get_current_user, bearer
+from body_limits import BodySizeLimitMiddleware
+from model_registry import model_registry
+from sessions import SESSION_CONFIG, create_session, revoke_session, purge_expired_sessions
 
 
 from routers import users, teams, marks, games, regions, tasks, roles, statues
@@ -23,10 +28,12 @@ app.include_router(tasks.router)
 app.include_router(roles.router)
 app.include_router(statues.router)
 
+app.add_middleware(BodySizeLimitMiddleware, limits=statues.BODY_LIMITS)
+
 # Эндпоинты авторизации
 @app.post("/auth/login", response_model=AuthResponse)
-async def login(user_data: UserLogin, conn = Depends(get_db_connection)):
-    user = authenticate_user(user_data.username, user_data.password, conn)
+async def login(user_data: UserLogin, conn = Depends(get_async_db)):
+    user = await authenticate_user(user_data.username, user_data.password, conn)
     
     if not user:
         raise HTTPException(
@@ -34,10 +41,11 @@ async def login(user_data: UserLogin, conn = Depends(get_db_connection)):
             detail="Неверное имя пользователя или пароль",
         )
     
-    access_token = secrets.token_hex(32)
+    access_token = await create_session(conn, user)
     
     return AuthResponse(
         access_token=access_token,
+        expires_in=int(SESSION_CONFIG["lifetime"].total_seconds()),
         user_id=user['id'],
         username=user['username'],
         first_name=user['first_name'],  # ← ДОБАВЬТЕ
@@ -46,17 +54,44 @@ async def login(user_data: UserLogin, conn = Depends(get_db_connection)):
     )
 
 @app.get("/auth/me")
-async def get_current_user(credentials: HTTPBasicCredentials = Depends(security)):
-    return {"message": "Информация о пользователе", "username": credentials.username}
+async def get_me(user: dict = Depends(get_current_user)):
+    return {"message": "Информация о пользователе", **user}
+
+@app.post("/auth/logout")
+async def logout(
+    credentials: HTTPAuthorizationCredentials = Depends(bearer),
+    user: dict = Depends(get_current_user),
+    conn = Depends(get_async_db)
+):
+    await revoke_session(conn, credentials.credentials)
+    return {"message": "Сессия завершена"}
 
 @app.on_event("startup")
 async def startup_event():
+    # Модель грузится в фоне: API отвечает сразу, распознавание - после прогрева.
+    # Реестр следит за папкой models и подменяет версию без перезапуска
+    model_registry.start()
     create_tables()
+    init_pool()
+    pool = await init_async_pool()
+    async with pool.acquire() as conn:
+        await purge_expired_sessions(conn)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    model_registry.stop()
+    close_pool()
+    await close_async_pool()
 
 @app.get("/")
 async def root():
     return {"message": "NetMan API", "version": "1.0.0"}
 
+@app.get("/health/db")
+async def db_health():
+    """Статистика пулов соединений с БД"""
+    return {"sync": get_pool_stats(), "async": get_async_pool_stats()}
+
 # Добавьте после создания app
 app.add_middleware(
     CORSMiddleware,
@@ -0,0 +1,180 @@
+import asyncio
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+from geo import BBox
+
+CLUSTER_CONFIG = {
+    "max_zoom": 18,           # на этом зуме и выше кластеры не строятся
+    "radius_px": 60,          # размер ячейки сетки в пикселях экрана
+    "tile_size": 256,
+    "reload_interval": 300.0, # полная перезагрузка из БД (изменения из других процессов)
+}
+
+
+def lonlat_to_world(lon: float, lat: float) -> Tuple[float, float]:
+    """Проекция Web Mercator в координаты [0, 1) x [0, 1)"""
+    lat = max(-85.05112878, min(85.05112878, lat))
+    x = (lon + 180.0) / 360.0
+    sin_lat = math.sin(math.radians(lat))
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return min(max(x, 0.0), 0.999999999), min(max(y, 0.0), 0.999999999)
+
+
+class _Cell:
+    __slots__ = ("ids", "sum_lon", "sum_lat", "rep")
+
+    def __init__(self):
+        self.ids = set()
+        self.sum_lon = 0.0
+        self.sum_lat = 0.0
+        self.rep = None
+
+
+class ClusterIndex:
+    """
+    Сеточная кластеризация активных меток. Сетка каждого зума строится при первом
+    запросе и дальше обновляется инкрементально при изменении меток.
+    """
+
+    def __init__(self, max_zoom: int, radius_px: int, tile_size: int, reload_interval: float):
+        self.max_zoom = max_zoom
+        self.radius_px = radius_px
+        self.tile_size = tile_size
+        self.reload_interval = reload_interval
+        self._points: Dict[int, Tuple[float, float]] = {}
+        self._levels: Dict[int, Dict[Tuple[int, int], _Cell]] = {}
+        self._loaded_at: Optional[float] = None
+        self._load_lock = asyncio.Lock()
+        # Изменения, пришедшие во время загрузки из БД: повторяются на новом снимке
+        self._pending: Optional[List[tuple]] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def _cells_per_axis(self, zoom: int) -> int:
+        return max(1, (2 ** zoom) * self.tile_size // self.radius_px)
+
+    def _cell_key(self, zoom: int, lon: float, lat: float) -> Tuple[int, int]:
+        n = self._cells_per_axis(zoom)
+        x, y = lonlat_to_world(lon, lat)
+        return int(x * n), int(y * n)
+
+    def _level(self, zoom: int) -> Dict[Tuple[int, int], _Cell]:
+        level = self._levels.get(zoom)
+        if level is None:
+            level = {}
+            for mark_id, (lon, lat) in self._points.items():
+                self._add_to_level(level, zoom, mark_id, lon, lat)
+            self._levels[zoom] = level
+        return level
+
+    def _add_to_level(self, level, zoom, mark_id, lon, lat):
+        key = self._cell_key(zoom, lon, lat)
+        cell = level.get(key)
+        if cell is None:
+            cell = level[key] = _Cell()
+        cell.ids.add(mark_id)
+        cell.sum_lon += lon
+        cell.sum_lat += lat
+        if cell.rep is not None and mark_id < cell.rep:
+            cell.rep = mark_id
+
+    def _remove_from_level(self, level, zoom, mark_id, lon, lat):
+        key = self._cell_key(zoom, lon, lat)
+        cell = level.get(key)
+        if cell is None or mark_id not in cell.ids:
+            return
+        cell.ids.discard(mark_id)
+        if not cell.ids:
+            del level[key]
+            return
+        cell.sum_lon -= lon
+        cell.sum_lat -= lat
+        if cell.rep == mark_id:
+            cell.rep = None
+
+    async def ensure_loaded(self, pool):
+        """Загружает координаты активных меток, если кэш пуст или устарел"""
+        if self.loaded and time.monotonic() - self._loaded_at < self.reload_interval:
+            return
+        async with self._load_lock:
+            if self.loaded and time.monotonic() - self._loaded_at < self.reload_interval:
+                return
+            self._pending = []
+            try:
+                async with pool.acquire() as conn:
+                    rows = await conn.fetch("SELECT id, longitude, latitude FROM marks WHERE is_active")
+                points = {row['id']: (row['longitude'], row['latitude']) for row in rows}
+                # Снимок мог быть прочитан до этих изменений; повтор безопасен, если и после
+                for op in self._pending:
+                    if op[0] == 'upsert':
+                        points[op[1]] = op[2]
+                    else:
+                        points.pop(op[1], None)
+            finally:
+                self._pending = None
+            self._points = points
+            self._levels = {}
+            self._loaded_at = time.monotonic()
+
+    def upsert(self, mark_id: int, lon: float, lat: float):
+        """Метка создана или перемещена"""
+        if self._pending is not None:
+            self._pending.append(('upsert', mark_id, (lon, lat)))
+        if not self.loaded:
+            return
+        self._discard(mark_id)
+        self._points[mark_id] = (lon, lat)
+        for zoom, level in self._levels.items():
+            self._add_to_level(level, zoom, mark_id, lon, lat)
+
+    def remove(self, mark_id: int):
+        """Метка деактивирована"""
+        if self._pending is not None:
+            self._pending.append(('remove', mark_id))
+        if self.loaded:
+            self._discard(mark_id)
+
+    def _discard(self, mark_id: int):
+        point = self._points.pop(mark_id, None)
+        if point is None:
+            return
+        for zoom, level in self._levels.items():
+            self._remove_from_level(level, zoom, mark_id, *point)
+
+    def clusters(self, zoom: int, bbox: BBox) -> List[dict]:
+        level = self._level(zoom)
+        min_lon, min_lat, max_lon, max_lat = bbox
+        x0, y1 = self._cell_key(zoom, min_lon, min_lat)
+        x1, y0 = self._cell_key(zoom, max_lon, max_lat)
+
+        if (x1 - x0 + 1) * (y1 - y0 + 1) < len(level):
+            keys = ((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+            cells = ((key, level.get(key)) for key in keys)
+        else:
+            cells = (
+                (key, cell) for key, cell in level.items()
+                if x0 <= key[0] <= x1 and y0 <= key[1] <= y1
+            )
+
+        result = []
+        for _, cell in cells:
+            if cell is None:
+                continue
+            if cell.rep is None:
+                cell.rep = min(cell.ids)
+            count = len(cell.ids)
+            result.append({
+                "count": count,
+                "longitude": cell.sum_lon / count,
+                "latitude": cell.sum_lat / count,
+                "mark_id": cell.rep,
+            })
+        return result
+
+
+# Кэш на процесс: у каждого воркера uvicorn свой, синхронизация через reload_interval
+cluster_index = ClusterIndex(**CLUSTER_CONFIG)
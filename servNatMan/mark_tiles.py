@@ -0,0 +1,128 @@
+import logging
+import math
+from typing import Dict, List, Tuple
+
+from cache import TTLCache
+from geo import BBox, bbox_filter
+from mark_clusters import lonlat_to_world
+
+logger = logging.getLogger(__name__)
+
+try:
+    import mapbox_vector_tile
+except ImportError:
+    mapbox_vector_tile = None
+    logger.warning("⚠️ mapbox_vector_tile не установлен, /marks/tiles недоступен")
+
+TILE_CONFIG = {
+    "max_zoom": 20,
+    "extent": 4096,
+    "buffer_px": 64,       # запас вокруг тайла, чтобы подписи на краю не обрезались
+    "cache_size": 20000,
+    # Кэш свой в каждом процессе, а invalidate_point сбрасывает тайлы только в текущем:
+    # другие воркеры видят изменения не позже чем через cache_ttl (как max-age в ответе)
+    "cache_ttl": 60.0,
+}
+
+tile_cache = TTLCache(maxsize=TILE_CONFIG["cache_size"], ttl=TILE_CONFIG["cache_ttl"])
+
+# Тайлы, которые сейчас рисуются: ключ -> [число запросов, поколение].
+# invalidate_point увеличивает поколение, и тайл, прочитанный из БД до изменения,
+# не попадает в кэш
+_rendering: Dict[Tuple[int, int, int], List[int]] = {}
+
+
+def tile_bbox(z: int, x: int, y: int, buffer: float = 0.0) -> BBox:
+    """Границы тайла в градусах; buffer в долях тайла"""
+    n = 2 ** z
+
+    def lon(tx):
+        return tx / n * 360.0 - 180.0
+
+    def lat(ty):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+    return (
+        max(-180.0, lon(x - buffer)),
+        max(-90.0, lat(y + 1 + buffer)),
+        min(180.0, lon(x + 1 + buffer)),
+        min(90.0, lat(y - buffer)),
+    )
+
+
+def tiles_for_point(lon: float, lat: float):
+    """Все тайлы (z, x, y), в которые попадает точка (с учетом буфера)"""
+    wx, wy = lonlat_to_world(lon, lat)
+    buffer = TILE_CONFIG["buffer_px"] / TILE_CONFIG["extent"]
+    for z in range(TILE_CONFIG["max_zoom"] + 1):
+        n = 2 ** z
+        px, py = wx * n, wy * n
+        xs = {int(px), int(px - buffer), int(px + buffer)}
+        ys = {int(py), int(py - buffer), int(py + buffer)}
+        for x in xs:
+            for y in ys:
+                if 0 <= x < n and 0 <= y < n:
+                    yield z, x, y
+
+
+def invalidate_point(lon: float, lat: float):
+    """Сбрасывает закэшированные тайлы, в которые попадает точка"""
+    for key in tiles_for_point(lon, lat):
+        tile_cache.pop(key)
+        state = _rendering.get(key)
+        if state is not None:
+            state[1] += 1
+
+
+def _to_tile_coords(z: int, x: int, y: int, lon: float, lat: float) -> Tuple[int, int]:
+    n = 2 ** z
+    extent = TILE_CONFIG["extent"]
+    wx, wy = lonlat_to_world(lon, lat)
+    tx = round((wx * n - x) * extent)
+    ty = round((wy * n - y) * extent)
+    # encode() по умолчанию ожидает ось Y вверх и сам переворачивает ее
+    return tx, extent - ty
+
+
+def cached_tile(z: int, x: int, y: int):
+    """Готовый тайл из кэша или None"""
+    return tile_cache.get((z, x, y))
+
+
+async def render_tile(conn, z: int, x: int, y: int) -> bytes:
+    """MVT-тайл со слоем marks из активных меток; результат кэшируется"""
+    key = (z, x, y)
+    cached = tile_cache.get(key)
+    if cached is not None:
+        return cached
+
+    buffer = TILE_CONFIG["buffer_px"] / TILE_CONFIG["extent"]
+    sql, params = bbox_filter(tile_bbox(z, x, y, buffer), 1)
+    state = _rendering.setdefault(key, [0, 0])
+    state[0] += 1
+    generation = state[1]
+    try:
+        rows = await conn.fetch(f"""
+            SELECT m.id, m.mark_name, m.longitude, m.latitude
+            FROM marks m
+            WHERE m.is_active AND {sql}
+        """, *params)
+    finally:
+        state[0] -= 1
+        if state[0] == 0:
+            _rendering.pop(key, None)
+    # Дальше до set нет await: invalidate_point не может вклиниться
+    fresh = state[1] == generation
+
+    features = []
+    for row in rows:
+        tx, ty = _to_tile_coords(z, x, y, row['longitude'], row['latitude'])
+        features.append({
+            "geometry": f"POINT({tx} {ty})",
+            "properties": {"id": row['id'], "mark_name": row['mark_name'] or ""},
+        })
+
+    data = mapbox_vector_tile.encode([{"name": "marks", "features": features}])
+    if fresh:
+        tile_cache.set(key, data)
+    return data
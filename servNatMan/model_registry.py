@@ -0,0 +1,355 @@
+# model_registry.py
+import logging
+import os
+import random
+import re
+import threading
+from typing import Dict, List, Optional
+
+from statue_recognition import StatueRecognizer, MODEL_BACKEND, MODEL_FILES, METADATA_FILE
+from near_duplicates import near_duplicate_index
+
+logger = logging.getLogger(__name__)
+
+# Версии модели - подпапки root (например ../models/v3/ с файлом модели и class_names.json).
+# Старая раскладка (файлы прямо в root) видна как версия "default".
+REGISTRY_CONFIG = {
+    "root": "../models",
+    "backend": MODEL_BACKEND,
+    "poll_interval": 30.0,       # секунд между проверками папки на новые версии
+    "pinned": None,              # имя версии, которая всегда активна; None - самая новая
+    "split": {},                 # доля трафика на другие версии, например {"v4": 0.1}
+    "low_confidence": 0.5,       # порог уверенности топ-1 для статистики
+}
+
+DEFAULT_VERSION = "default"
+
+
+def _natural_key(name: str):
+    # v10 после v9, а не после v1
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)]
+
+
+class VersionStats:
+    """Задержка и уверенность ответов одной версии модели"""
+
+    def __init__(self, low_confidence: float):
+        self.low_confidence = low_confidence
+        self.requests = 0
+        self.errors = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.confidence_total = 0.0
+        self.low_confidence_count = 0
+
+    def record(self, latency: float, result: Dict):
+        self.requests += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        objects = result.get('objects') if result.get('success') else None
+        if not objects:
+            self.errors += 1
+            return
+        confidence = objects[0]['confidence']
+        self.confidence_total += confidence
+        if confidence < self.low_confidence:
+            self.low_confidence_count += 1
+
+    def as_dict(self) -> dict:
+        answered = self.requests - self.errors
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "avg_latency_ms": round(self.latency_total / self.requests * 1000, 2) if self.requests else 0.0,
+            "max_latency_ms": round(self.latency_max * 1000, 2),
+            "avg_confidence": round(self.confidence_total / answered, 4) if answered else 0.0,
+            "low_confidence": self.low_confidence_count,
+        }
+
+
+class ModelRegistry:
+    """
+    Версии модели распознавания с заменой без перезапуска сервера.
+    Фоновый поток находит новые версии (или замененные файлы), загружает и прогревает их,
+    и только после этого атомарно переключает трафик. Старая версия выгружается,
+    когда завершатся все запросы, которые успели ее взять.
+    """
+
+    def __init__(self, root: str, backend: str, poll_interval: float,
+                 pinned: Optional[str] = None, split: Optional[Dict[str, float]] = None,
+                 low_confidence: float = 0.5, near_duplicates=None):
+        self.root = root
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self.pinned = pinned
+        self.split = split or {}
+        self.low_confidence = low_confidence
+        self.near_duplicates = near_duplicates
+        self.state = "not_loaded"
+        self._lock = threading.Lock()
+        self._recognizers: Dict[str, StatueRecognizer] = {}
+        self._signatures: Dict[str, tuple] = {}
+        self._failed: Dict[str, tuple] = {}
+        self._stats: Dict[str, VersionStats] = {}
+        self._inflight: Dict[StatueRecognizer, int] = {}
+        self._retired: List[StatueRecognizer] = []
+        self._active: Optional[str] = None
+        # Версии в root на момент последней проверки: health не сканирует папку сам
+        self._available: List[str] = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._watcher = None
+
+    # --- поиск версий ---
+
+    def _version_dir(self, name: str) -> str:
+        return self.root if name == DEFAULT_VERSION else os.path.join(self.root, name)
+
+    def _signature(self, model_dir: str) -> Optional[tuple]:
+        """Размер и время изменения файлов версии; None, если версия неполная"""
+        signature = []
+        for filename in (MODEL_FILES[self.backend], 'class_names.json'):
+            try:
+                stat = os.stat(os.path.join(model_dir, filename))
+            except OSError:
+                return None
+            signature.append((stat.st_size, stat.st_mtime_ns))
+        # Метаданные статуй необязательны, но их правка тоже перезагружает версию
+        try:
+            stat = os.stat(os.path.join(model_dir, METADATA_FILE))
+            signature.append((stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            pass
+        return tuple(signature)
+
+    def list_versions(self) -> Dict[str, tuple]:
+        """Все полные версии в root: имя -> сигнатура файлов"""
+        versions = {}
+        signature = self._signature(self.root)
+        if signature is not None:
+            versions[DEFAULT_VERSION] = signature
+        try:
+            entries = list(os.scandir(self.root))
+        except OSError:
+            return versions
+        for entry in entries:
+            if entry.is_dir():
+                signature = self._signature(entry.path)
+                if signature is not None:
+                    versions[entry.name] = signature
+        return versions
+
+    def _wanted(self, versions: Dict[str, tuple]) -> List[str]:
+        """Какие версии держать загруженными: закрепленная (или самая новая) и версии из split"""
+        if not versions:
+            return []
+        if self.pinned in versions:
+            primary = self.pinned
+        else:
+            if self.pinned:
+                logger.warning(f"⚠️ Закрепленная версия модели {self.pinned} не найдена")
+            named = sorted((name for name in versions if name != DEFAULT_VERSION), key=_natural_key)
+            primary = named[-1] if named else DEFAULT_VERSION
+        wanted = [primary]
+        wanted += [name for name in self.split if name in versions and name != primary]
+        return wanted
+
+    # --- загрузка и переключение ---
+
+    def start(self):
+        """Запуск фонового потока: первая загрузка сразу, дальше проверка раз в poll_interval"""
+        if self._watcher is not None:
+            return
+        self.state = "loading"
+        self._watcher = threading.Thread(target=self._watch, name="model-registry", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _watch(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"❌ Ошибка проверки версий модели: {e}")
+            # Сбой бэкенда будит поток раньше, чтобы версия перезагрузилась сразу
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def refresh(self):
+        """Загрузить новые или измененные версии и переключить активную"""
+        versions = self.list_versions()
+        self._available = sorted(versions, key=_natural_key)
+        wanted = self._wanted(versions)
+        if not wanted:
+            if self._active is None:
+                logger.error(f"❌ В {os.path.abspath(self.root)} нет ни одной версии модели")
+                self.state = "failed"
+            return
+
+        for name in wanted:
+            signature = versions[name]
+            current = self._recognizers.get(name)
+            if current is not None and current.backend_failed and self._failed.get(name) != signature:
+                # Файлы те же, но бэкенд версии неисправен - загружаем ее заново
+                logger.warning(f"⚠️ Бэкенд версии модели {name} неисправен: {current.backend_failed}")
+            elif self._signatures.get(name) == signature or self._failed.get(name) == signature:
+                continue
+            if self._active is None:
+                self.state = "loading"
+            recognizer = self._load(name)
+            if recognizer is None:
+                self._failed[name] = signature
+                continue
+            self._install(name, recognizer, signature)
+
+        with self._lock:
+            if wanted[0] in self._recognizers and self._active != wanted[0]:
+                logger.info(f"🔀 Активная версия модели: {self._active} -> {wanted[0]}")
+                self._active = wanted[0]
+            # Версии, которые больше не нужны, уходят на выгрузку
+            for name in list(self._recognizers):
+                if name not in wanted and name != self._active:
+                    self._retire(self._recognizers.pop(name))
+                    self._signatures.pop(name, None)
+            self.state = "ready" if self._active is not None else "failed"
+
+    def _load(self, name: str) -> Optional[StatueRecognizer]:
+        logger.info(f"🔄 Загрузка версии модели {name}...")
+        recognizer = StatueRecognizer(
+            model_dir=self._version_dir(name),
+            backend=self.backend,
+            near_duplicates=self.near_duplicates,
+        )
+        recognizer.version = name
+        if recognizer.load_model():
+            if self._active is None:
+                # Пока ни одной версии нет, в health видно, на каком шаге первая загрузка
+                self.state = "warming"
+            recognizer.warm_up()
+        if not recognizer.is_loaded:
+            logger.error(f"❌ Версия модели {name} не загружена")
+            return None
+        return recognizer
+
+    def _install(self, name: str, recognizer: StatueRecognizer, signature: tuple):
+        """Атомарная замена: новые запросы сразу получают прогретую модель"""
+        with self._lock:
+            previous = self._recognizers.get(name)
+            self._recognizers[name] = recognizer
+            self._signatures[name] = signature
+            self._failed.pop(name, None)
+            self._stats.setdefault(name, VersionStats(self.low_confidence))
+            if previous is not None:
+                self._retire(previous)
+        logger.info(f"✅ Версия модели {name} готова ({recognizer.model_version})")
+
+    def _retire(self, recognizer: StatueRecognizer):
+        # Вызывается под self._lock
+        if self._inflight.get(recognizer, 0) == 0:
+            self._schedule_unload(recognizer)
+        else:
+            self._retired.append(recognizer)
+
+    def _schedule_unload(self, recognizer: StatueRecognizer):
+        """
+        Вызывается под self._lock, в том числе из release() в event loop.
+        Сама выгрузка (у пула процессов - join до нескольких секунд) идет
+        в отдельном потоке, без блокировки реестра.
+        """
+        model_version = recognizer.model_version
+        # Дубли версии больше не нужны, если ее не загрузили заново из тех же файлов
+        drop_near_duplicates = (
+            self.near_duplicates is not None and model_version is not None
+            and not any(other.model_version == model_version for other in self._recognizers.values())
+        )
+        threading.Thread(
+            target=self._unload, args=(recognizer, model_version if drop_near_duplicates else None),
+            name="model-unload", daemon=True,
+        ).start()
+
+    def _unload(self, recognizer: StatueRecognizer, drop_version: Optional[str]):
+        try:
+            recognizer.unload()
+        except Exception as e:
+            logger.error(f"❌ Ошибка выгрузки версии модели {recognizer.version}: {e}")
+        if drop_version is not None:
+            self.near_duplicates.drop(drop_version)
+
+    # --- обслуживание запросов ---
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._active is not None
+
+    @property
+    def active(self) -> Optional[StatueRecognizer]:
+        with self._lock:
+            return self._recognizers.get(self._active) if self._active else None
+
+    def acquire(self, version: Optional[str] = None) -> Optional[StatueRecognizer]:
+        """
+        Выбрать версию для запроса и удержать ее до release().
+        version - явное закрепление запроса за версией, иначе активная с учетом split.
+        """
+        with self._lock:
+            if self._active is None:
+                return None
+            if version is not None:
+                recognizer = self._recognizers.get(version)
+                if recognizer is None:
+                    return None
+            else:
+                recognizer = self._recognizers[self._active]
+                roll = random.random()
+                for name, share in self.split.items():
+                    if roll < share:
+                        recognizer = self._recognizers.get(name, recognizer)
+                        break
+                    roll -= share
+            self._inflight[recognizer] = self._inflight.get(recognizer, 0) + 1
+            return recognizer
+
+    def release(self, recognizer: StatueRecognizer):
+        with self._lock:
+            count = self._inflight.get(recognizer, 0) - 1
+            if count > 0:
+                self._inflight[recognizer] = count
+                return
+            self._inflight.pop(recognizer, None)
+            if recognizer in self._retired:
+                self._retired.remove(recognizer)
+                self._schedule_unload(recognizer)
+
+    def record(self, recognizer: StatueRecognizer, latency: float, result: Dict):
+        if recognizer.backend_failed:
+            self._wake.set()
+        stats = self._stats.get(recognizer.version)
+        if stats is not None:
+            stats.record(latency, result)
+
+    def stats(self) -> dict:
+        with self._lock:
+            versions = {
+                name: {
+                    "model_version": recognizer.model_version,
+                    "state": recognizer.state,
+                    "inflight": self._inflight.get(recognizer, 0),
+                    **self._stats[name].as_dict(),
+                }
+                for name, recognizer in self._recognizers.items()
+            }
+            return {
+                "state": self.state,
+                "active": self._active,
+                "pinned": self.pinned,
+                "split": self.split,
+                "versions": versions,
+                "draining": len(self._retired),
+                "available": self._available,
+            }
+
+
+model_registry = ModelRegistry(**REGISTRY_CONFIG, near_duplicates=near_duplicate_index)
@@ -84,6 +84,7 @@ class UserLogin(BaseModel):
 class AuthResponse(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    expires_in: int = 0
     user_id: int
     username: str
     first_name: str  # ← ДОБАВЬТЕ
@@ -101,10 +102,17 @@ class RecognizedObject(BaseModel):
     confidence: float
     description: str
     interesting_fact: str
+    mark_id: Optional[int] = None  # метка на карте, где стоит статуя
 
 class RecognitionResponse(BaseModel):
     success: bool
     objects: List[RecognizedObject] = []
     error: Optional[str] = None
+
+class RecognitionBatchRequest(BaseModel):
+    images: List[str]  # base64 encoded images
+
+class RecognitionBatchResponse(BaseModel):
+    results: List[RecognitionResponse]
 from pydantic import BaseModel
 from typing import List, Optional
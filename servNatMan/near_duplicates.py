@@ -0,0 +1,145 @@
+# near_duplicates.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+NEAR_DUPLICATE_CONFIG = {
+    "enabled": False,
+    "max_distance": 4,   # максимальное расстояние Хэмминга между dHash, считающееся дублем
+    "maxsize": 100000,
+}
+
+HASH_BITS = 64
+
+
+def dhash(image: Image.Image) -> int:
+    """64-битный разностный хэш: устойчив к пережатию, масштабу и небольшой обрезке"""
+    small = image.convert('L').resize((9, 8), Image.BILINEAR)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(8):
+        offset = row * 9
+        for col in range(8):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def _chunk_ranges(chunks: int) -> List[Tuple[int, int]]:
+    """Деление 64 бит на chunks почти равных частей: (сдвиг, маска)"""
+    ranges = []
+    start = 0
+    for i in range(chunks):
+        width = HASH_BITS // chunks + (1 if i < HASH_BITS % chunks else 0)
+        ranges.append((start, (1 << width) - 1))
+        start += width
+    return ranges
+
+
+class _VersionTable:
+    """Хэши и результаты одной версии модели"""
+
+    def __init__(self, chunks: int):
+        self.tables: List[Dict[int, set]] = [{} for _ in range(chunks)]
+        self.entries: "OrderedDict[int, Dict]" = OrderedDict()
+
+
+class NearDuplicateIndex:
+    """
+    Индекс хэшей с поиском по расстоянию Хэмминга (multi-index hashing).
+    Хэш режется на max_distance + 1 частей: у хэшей на расстоянии не больше
+    max_distance хотя бы одна часть совпадает точно, поэтому кандидаты берутся
+    из max_distance + 1 словарей, а не перебором всех записей.
+
+    Записи хранятся отдельно по версиям модели: при A/B split запросы к разным
+    версиям не вытесняют друг друга. maxsize - на каждую версию; записи версии
+    удаляются через drop(), когда версия выгружается.
+    """
+
+    def __init__(self, max_distance: int, maxsize: int):
+        self.max_distance = max_distance
+        self.maxsize = maxsize
+        self._ranges = _chunk_ranges(max_distance + 1)
+        self._versions: Dict[str, _VersionTable] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.lookup_time = 0.0
+
+    def _chunks(self, value: int):
+        return [(value >> shift) & mask for shift, mask in self._ranges]
+
+    def lookup(self, value: int, model_version: str) -> Optional[Dict]:
+        start = time.perf_counter()
+        with self._lock:
+            version = self._versions.get(model_version)
+            best = None
+            best_distance = self.max_distance + 1
+            if version is not None:
+                for table, chunk in zip(version.tables, self._chunks(value)):
+                    for candidate in table.get(chunk, ()):
+                        distance = bin(candidate ^ value).count('1')
+                        if distance < best_distance:
+                            best, best_distance = candidate, distance
+
+            if best is None:
+                self.misses += 1
+                result = None
+            else:
+                self.hits += 1
+                version.entries.move_to_end(best)
+                result = version.entries[best]
+            self.lookup_time += time.perf_counter() - start
+            return result
+
+    def add(self, value: int, model_version: str, result: Dict):
+        with self._lock:
+            version = self._versions.get(model_version)
+            if version is None:
+                version = self._versions[model_version] = _VersionTable(len(self._ranges))
+            if value in version.entries:
+                version.entries[value] = result
+                version.entries.move_to_end(value)
+                return
+
+            version.entries[value] = result
+            for table, chunk in zip(version.tables, self._chunks(value)):
+                table.setdefault(chunk, set()).add(value)
+
+            while len(version.entries) > self.maxsize:
+                old, _ = version.entries.popitem(last=False)
+                for table, chunk in zip(version.tables, self._chunks(old)):
+                    bucket = table.get(chunk)
+                    if bucket is not None:
+                        bucket.discard(old)
+                        if not bucket:
+                            del table[chunk]
+
+    def drop(self, model_version: str):
+        """Удалить записи версии модели, которая больше не обслуживает запросы"""
+        with self._lock:
+            self._versions.pop(model_version, None)
+
+    def __len__(self) -> int:
+        return sum(len(version.entries) for version in self._versions.values())
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self),
+            "versions": len(self._versions),
+            "maxsize": self.maxsize,
+            "max_distance": self.max_distance,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "avg_lookup_us": round(self.lookup_time / total * 1e6, 2) if total else 0.0,
+        }
+
+
+near_duplicate_index = (
+    NearDuplicateIndex(NEAR_DUPLICATE_CONFIG["max_distance"], NEAR_DUPLICATE_CONFIG["maxsize"])
+    if NEAR_DUPLICATE_CONFIG["enabled"] else None
+)
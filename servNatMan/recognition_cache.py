@@ -0,0 +1,93 @@
+# recognition_cache.py
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+RECOGNITION_CACHE_CONFIG = {
+    "maxsize": 5000,     # записей в памяти
+    "ttl": 3600.0,       # секунд
+    "disk_dir": None,    # папка для второго уровня кэша на диске; None - только память
+}
+
+
+class RecognitionCache:
+    """
+    Кэш результатов распознавания по хэшу байтов изображения и версии модели.
+    Повторная отправка того же фото не декодируется и не прогоняется через модель.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, disk_dir: Optional[str] = None):
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_hits = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(image_data: bytes, model_version: str) -> str:
+        digest = hashlib.blake2b(image_data, digest_size=16).hexdigest()
+        return f"{model_version}-{digest}"
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[-2:], f"{key}.json")
+
+    async def get(self, key: str) -> Optional[Dict]:
+        result = self.memory.get(key)
+        if result is not None or not self.disk_dir:
+            return result
+
+        # Диск - в пуле потоков: вызывается из event loop
+        result = await asyncio.get_running_loop().run_in_executor(None, self._disk_get, key)
+        if result is not None:
+            self.disk_hits += 1
+            self.memory.set(key, result)
+        return result
+
+    def set(self, key: str, result: Dict):
+        self.memory.set(key, result)
+        if self.disk_dir:
+            # Запись на диск не задерживает ответ; ошибки логируются в _disk_set
+            asyncio.get_running_loop().run_in_executor(None, self._disk_set, key, result)
+
+    def _disk_get(self, key: str) -> Optional[Dict]:
+        path = self._disk_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _disk_set(self, key: str, result: Dict):
+        path = self._disk_path(key)
+        # Свое имя временного файла у каждого потока и процесса: одинаковые фото
+        # могут записываться одновременно, а os.replace атомарно публикует целый файл
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"⚠️ Не удалось записать кэш распознавания на диск: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        return {**self.memory.stats(), "disk_hits": self.disk_hits, "disk_enabled": bool(self.disk_dir)}
+
+
+recognition_cache = RecognitionCache(**RECOGNITION_CACHE_CONFIG)
@@ -1,146 +1,325 @@
-from fastapi import APIRouter, HTTPException, Depends
-import psycopg2
-from database import get_db_connection
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from typing import Optional
+from datetime import datetime
+import base64
+import asyncpg
+from database import get_async_db, init_async_pool, async_db_connection
 from models import MarkCreate, MarkResponse
+from geo import parse_bbox, parse_point, radius_bbox, bbox_filter, bboxes_filter, distance_sql
+from mark_clusters import cluster_index
+from http_cache import make_etag, conditional, tables_version
+import mark_tiles
 
 router = APIRouter(prefix="/marks", tags=["marks"])
 
+MARKS_DEFAULT_LIMIT = 100
+MARKS_MAX_LIMIT = 1000
+
+# Поля, доступные для выборки через fields=
+MARK_FIELDS = {
+    "id": "m.id",
+    "user_id": "m.user_id",
+    "longitude": "m.longitude",
+    "latitude": "m.latitude",
+    "mark_name": "m.mark_name",
+    "description": "m.description",
+    "address": "m.address",
+    "created_at": "m.created_at",
+    "updated_at": "m.updated_at",
+    "is_active": "m.is_active",
+    "creator_username": "u.username",
+}
+
+# Курсор - ключ сортировки последней метки страницы и ее id:
+# created_at для обычного списка, расстояние в метрах для поиска по радиусу
+def _encode_cursor(key: str, mark_id: int) -> str:
+    raw = f"{key}|{mark_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def _decode_cursor(cursor: str, parse_key):
+    try:
+        key, mark_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return parse_key(key), int(mark_id)
+    except Exception:
+        raise ValueError("Некорректный cursor")
+
 @router.get("/", response_model=dict)
-async def get_marks(conn = Depends(get_db_connection)):
-    with conn.cursor() as cur:
-        cur.execute("""
-            SELECT m.*, u.username as creator_username 
-            FROM marks m 
-            LEFT JOIN users u ON m.user_id = u.id 
-            ORDER BY m.created_at DESC
-        """)
-        marks = cur.fetchall()
-    return {"marks": marks}
+async def get_marks(
+    request: Request,
+    response: Response,
+    bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+    near: Optional[str] = Query(None, description="lat,lon"),
+    radius: Optional[float] = Query(None, gt=0, description="Радиус поиска вокруг near, в метрах"),
+    fields: Optional[str] = Query(None, description="Список полей через запятую, например id,latitude,longitude,mark_name"),
+    cursor: Optional[str] = Query(None, description="next_cursor из предыдущей страницы"),
+    limit: int = Query(MARKS_DEFAULT_LIMIT, ge=1),
+    conn = Depends(get_async_db)
+):
+    """
+    Активные метки постранично (keyset по created_at, id).
+    bbox или near+radius отбирают метки через GiST-индекс idx_marks_active_geo;
+    поиск по радиусу сортируется по расстоянию (keyset по расстоянию, id).
+    """
+    if fields:
+        requested = [f.strip() for f in fields.split(',') if f.strip()]
+        unknown = [f for f in requested if f not in MARK_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Неизвестные поля: {', '.join(unknown)}")
+    else:
+        requested = list(MARK_FIELDS)
+
+    # creator_username берется из users: ответ меняется и при записи в users
+    tables = ("marks", "users") if "creator_username" in requested else ("marks",)
+    versions, last_modified = await tables_version(conn, tables)
+    etag = make_etag("marks", versions, request.url.query)
+    not_modified = conditional(request, response, etag, last_modified)
+    if not_modified:
+        return not_modified
+
+    limit = min(limit, MARKS_MAX_LIMIT)
+    conditions = ["m.is_active"]
+    params = []
+
+    try:
+        # id и created_at нужны для курсора, даже если их не запросили
+        columns = [f"{MARK_FIELDS[f]} AS {f}" for f in requested]
+        columns += ["m.id AS _id", "m.created_at AS _created_at"]
+        join = "LEFT JOIN users u ON m.user_id = u.id" if "creator_username" in requested else ""
+
+        if bbox:
+            sql, values = bbox_filter(parse_bbox(bbox), len(params) + 1)
+            conditions.append(sql)
+            params.extend(values)
+
+        if near or radius:
+            if not (near and radius):
+                raise ValueError("near и radius задаются вместе")
+            lat, lon = parse_point(near)
+
+            # Грубый отбор по индексу, затем точное расстояние
+            sql, values = bboxes_filter(radius_bbox(lat, lon, radius), len(params) + 1)
+            conditions.append(sql)
+            params.extend(values)
+
+            distance = distance_sql(len(params) + 1, len(params) + 2)
+            params.extend([lat, lon])
+            conditions.append(f"{distance} <= ${len(params) + 1}")
+            params.append(radius)
+
+            columns.append(f"{distance} AS distance_m")
+            if cursor:
+                distance_m, mark_id = _decode_cursor(cursor, float)
+                conditions.append(f"({distance}, m.id) > (${len(params) + 1}, ${len(params) + 2})")
+                params.extend([distance_m, mark_id])
+            order_by = "distance_m, m.id"
+        else:
+            if cursor:
+                created_at, mark_id = _decode_cursor(cursor, datetime.fromisoformat)
+                conditions.append(f"(m.created_at, m.id) < (${len(params) + 1}, ${len(params) + 2})")
+                params.extend([created_at, mark_id])
+            order_by = "m.created_at DESC, m.id DESC"
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    params.append(limit + 1)
+    rows = await conn.fetch(f"""
+        SELECT {', '.join(columns)}
+        FROM marks m 
+        {join}
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {order_by}
+        LIMIT ${len(params)}
+    """, *params)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if near:
+            # repr float точно восстанавливается float(), граница страницы не сдвигается
+            next_cursor = _encode_cursor(repr(last['distance_m']), last['_id'])
+        else:
+            next_cursor = _encode_cursor(last['_created_at'].isoformat(), last['_id'])
+
+    marks = [
+        {key: value for key, value in row.items() if not key.startswith('_')}
+        for row in rows
+    ]
+    return {"marks": marks, "next_cursor": next_cursor}
 
 @router.post("/", response_model=dict)
-async def create_mark(mark: MarkCreate, conn = Depends(get_db_connection)):
-    with conn.cursor() as cur:
-        try:
-            # Проверяем существование пользователя
-            cur.execute("SELECT id FROM users WHERE id = %s", (mark.user_id,))
-            if not cur.fetchone():
-                raise HTTPException(status_code=400, detail="Пользователь не найден")
-            
-            cur.execute("""
-                INSERT INTO marks (user_id, longitude, latitude, mark_name, description, address)
-                VALUES (%s, %s, %s, %s, %s, %s) 
-                RETURNING id, created_at, updated_at
-            """, (
-                mark.user_id, mark.longitude, mark.latitude, 
-                mark.mark_name, mark.description, mark.address
-            ))
-            
-            result = cur.fetchone()
-            new_mark_id = result['id']
-            conn.commit()
-            
-            return {
-                "message": "Метка создана", 
-                "mark_id": new_mark_id,
-                "created_at": result['created_at'].isoformat(),
-                "updated_at": result['updated_at'].isoformat()
-            }
-            
-        except psycopg2.IntegrityError as e:
-            conn.rollback()
-            if "uq_coordinates" in str(e):
-                raise HTTPException(status_code=400, detail="Метка с такими координатами уже существует")
-            raise HTTPException(status_code=400, detail="Ошибка уникальности данных")
-        except Exception as e:
-            conn.rollback()
-            raise HTTPException(status_code=500, detail=f"Ошибка: {str(e)}")
+async def create_mark(mark: MarkCreate, conn = Depends(get_async_db)):
+    try:
+        # Проверяем существование пользователя
+        if not await conn.fetchval("SELECT id FROM users WHERE id = $1", mark.user_id):
+            raise HTTPException(status_code=400, detail="Пользователь не найден")
+        
+        result = await conn.fetchrow("""
+            INSERT INTO marks (user_id, longitude, latitude, mark_name, description, address)
+            VALUES ($1, $2, $3, $4, $5, $6) 
+            RETURNING id, created_at, updated_at
+        """,
+            mark.user_id, mark.longitude, mark.latitude, 
+            mark.mark_name, mark.description, mark.address
+        )
+        cluster_index.upsert(result['id'], mark.longitude, mark.latitude)
+        mark_tiles.invalidate_point(mark.longitude, mark.latitude)
+        
+        return {
+            "message": "Метка создана", 
+            "mark_id": result['id'],
+            "created_at": result['created_at'].isoformat(),
+            "updated_at": result['updated_at'].isoformat()
+        }
+        
+    except HTTPException:
+        raise
+    except asyncpg.IntegrityConstraintViolationError as e:
+        if e.constraint_name == "uq_coordinates":
+            raise HTTPException(status_code=400, detail="Метка с такими координатами уже существует")
+        raise HTTPException(status_code=400, detail="Ошибка уникальности данных")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка: {str(e)}")
+
+@router.get("/clusters", response_model=dict)
+async def get_mark_clusters(
+    bbox: str = Query(..., description="min_lon,min_lat,max_lon,max_lat"),
+    zoom: int = Query(..., ge=0, le=22)
+):
+    """
+    Кластеры активных меток для карты: количество, центр и id представительной метки
+    """
+    try:
+        area = parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    await cluster_index.ensure_loaded(await init_async_pool())
+    zoom = min(zoom, cluster_index.max_zoom)
+    clusters = cluster_index.clusters(zoom, area)
+    return {"zoom": zoom, "clusters": clusters, "total": len(clusters)}
+
+@router.get("/tiles/{z}/{x}/{y}.mvt")
+async def get_mark_tile(z: int, x: int, y: int):
+    """
+    Векторный тайл (Mapbox Vector Tile) со слоем marks.
+    Соединение с БД берется только при промахе кэша тайлов
+    """
+    if mark_tiles.mapbox_vector_tile is None:
+        raise HTTPException(status_code=503, detail="Векторные тайлы недоступны на сервере")
+    if not (0 <= z <= mark_tiles.TILE_CONFIG["max_zoom"] and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Тайл не найден")
+
+    data = mark_tiles.cached_tile(z, x, y)
+    if data is None:
+        async with async_db_connection() as conn:
+            data = await mark_tiles.render_tile(conn, z, x, y)
+    return Response(
+        content=data,
+        media_type="application/vnd.mapbox-vector-tile",
+        headers={"Cache-Control": "public, max-age=60"},
+    )
 
 @router.get("/{mark_id}", response_model=MarkResponse)
-async def get_mark_by_id(mark_id: int, conn = Depends(get_db_connection)):
+async def get_mark_by_id(
+    mark_id: int,
+    request: Request,
+    response: Response,
+    conn = Depends(get_async_db)
+):
     """
     Получение конкретной метки по ID
     """
-    with conn.cursor() as cur:
-        cur.execute("SELECT * FROM marks WHERE id = %s", (mark_id,))
-        mark = cur.fetchone()
-        
-        if not mark:
-            raise HTTPException(status_code=404, detail="Метка не найдена")
-        
-        return mark
+    mark = await conn.fetchrow("SELECT * FROM marks WHERE id = $1", mark_id)
+    
+    if not mark:
+        raise HTTPException(status_code=404, detail="Метка не найдена")
+    
+    etag = make_etag("mark", mark_id, mark['updated_at'])
+    not_modified = conditional(request, response, etag, mark['updated_at'])
+    if not_modified:
+        return not_modified
+    
+    return dict(mark)
 
 @router.put("/{mark_id}", response_model=dict)
 async def update_mark(
     mark_id: int, 
     mark_data: MarkCreate,  # Используем ту же модель
-    conn = Depends(get_db_connection)
+    conn = Depends(get_async_db)
 ):
     """
     Обновление метки
     """
-    with conn.cursor() as cur:
-        try:
-            # Проверяем существование метки
-            cur.execute("SELECT id FROM marks WHERE id = %s", (mark_id,))
-            if not cur.fetchone():
-                raise HTTPException(status_code=404, detail="Метка не найдена")
-            
-            cur.execute("""
-                UPDATE marks 
-                SET user_id = %s, 
-                    longitude = %s, 
-                    latitude = %s, 
-                    mark_name = %s, 
-                    description = %s, 
-                    address = %s,
-                    updated_at = NOW()
-                WHERE id = %s
-                RETURNING id, updated_at
-            """, (
-                mark_data.user_id, mark_data.longitude, mark_data.latitude,
-                mark_data.mark_name, mark_data.description, mark_data.address,
-                mark_id
-            ))
-            
-            result = cur.fetchone()
-            conn.commit()
-            
-            return {
-                "message": "Метка обновлена",
-                "mark_id": result['id'],
-                "updated_at": result['updated_at'].isoformat()
-            }
-            
-        except psycopg2.IntegrityError as e:
-            conn.rollback()
-            if "uq_coordinates" in str(e):
-                raise HTTPException(status_code=400, detail="Метка с такими координатами уже существует")
-            raise HTTPException(status_code=400, detail="Ошибка уникальности данных")
-        except Exception as e:
-            conn.rollback()
-            raise HTTPException(status_code=500, detail=f"Ошибка: {str(e)}")
+    try:
+        # Старые координаты нужны, чтобы сбросить тайлы, где метка была раньше
+        result = await conn.fetchrow("""
+            WITH old AS (
+                SELECT id, longitude, latitude FROM marks WHERE id = $7 FOR UPDATE
+            )
+            UPDATE marks m
+            SET user_id = $1, 
+                longitude = $2, 
+                latitude = $3, 
+                mark_name = $4, 
+                description = $5, 
+                address = $6,
+                updated_at = NOW()
+            FROM old
+            WHERE m.id = old.id
+            RETURNING m.id, m.updated_at, m.is_active,
+                      old.longitude AS old_longitude, old.latitude AS old_latitude
+        """,
+            mark_data.user_id, mark_data.longitude, mark_data.latitude,
+            mark_data.mark_name, mark_data.description, mark_data.address,
+            mark_id
+        )
+        
+        if not result:
+            raise HTTPException(status_code=404, detail="Метка не найдена")
+        
+        if result['is_active']:
+            cluster_index.upsert(mark_id, mark_data.longitude, mark_data.latitude)
+        mark_tiles.invalidate_point(result['old_longitude'], result['old_latitude'])
+        mark_tiles.invalidate_point(mark_data.longitude, mark_data.latitude)
+        
+        return {
+            "message": "Метка обновлена",
+            "mark_id": result['id'],
+            "updated_at": result['updated_at'].isoformat()
+        }
+        
+    except HTTPException:
+        raise
+    except asyncpg.IntegrityConstraintViolationError as e:
+        if e.constraint_name == "uq_coordinates":
+            raise HTTPException(status_code=400, detail="Метка с такими координатами уже существует")
+        raise HTTPException(status_code=400, detail="Ошибка уникальности данных")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка: {str(e)}")
 
 @router.delete("/{mark_id}", response_model=dict)
-async def delete_mark(mark_id: int, conn = Depends(get_db_connection)):
+async def delete_mark(mark_id: int, conn = Depends(get_async_db)):
     """
     Сделать метку неактивной
     """
-    with conn.cursor() as cur:
-        try:
-            # Вместо удаления помечаем как неактивную
-            cur.execute("""
-                UPDATE marks 
-                SET is_active = FALSE, updated_at = NOW()
-                WHERE id = %s
-                RETURNING id
-            """, (mark_id,))
-            
-            if cur.rowcount == 0:
-                raise HTTPException(status_code=404, detail="Метка не найдена")
-            
-            conn.commit()
-            return {"message": "Метка помечена как неактивная", "mark_id": mark_id}
-            
-        except Exception as e:
-            conn.rollback()
-            raise HTTPException(status_code=500, detail=f"Ошибка: {str(e)}")
+    try:
+        # Вместо удаления помечаем как неактивную
+        result = await conn.fetchrow("""
+            UPDATE marks 
+            SET is_active = FALSE, updated_at = NOW()
+            WHERE id = $1
+            RETURNING id, longitude, latitude
+        """, mark_id)
+        
+        if result is None:
+            raise HTTPException(status_code=404, detail="Метка не найдена")
+        
+        cluster_index.remove(mark_id)
+        mark_tiles.invalidate_point(result['longitude'], result['latitude'])
+        return {"message": "Метка помечена как неактивная", "mark_id": mark_id}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка: {str(e)}")
@@ -1,22 +1,64 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi import APIRouter, HTTPException, UploadFile, File, Request, Response, Header
+from typing import Optional
 import base64
 import io
-from statue_recognition import statue_recognizer
-from models import RecognitionRequest, RecognitionResponse
+from model_registry import model_registry
+from inference import recognition_scheduler, INFERENCE_CONFIG
+from recognition_cache import recognition_cache
+from near_duplicates import near_duplicate_index
+from statue_inference.preprocessing import MAX_IMAGE_BYTES
+from models import RecognitionRequest, RecognitionResponse, RecognitionBatchRequest, RecognitionBatchResponse
+from http_cache import make_etag, conditional
 
 router = APIRouter(prefix="/statues", tags=["statues"])
 
+# Меньше очереди распознавания: один полный батч не должен занимать ее целиком
+MAX_BATCH_IMAGES = INFERENCE_CONFIG["max_queue"] // 2
+MAX_BATCH_BYTES = 64 * 1024 * 1024
+
+# Лимиты тела запроса для BodySizeLimitMiddleware (проверяются во время чтения потока)
+BODY_LIMITS = {
+    "/statues/recognize": MAX_IMAGE_BYTES * 4 // 3 + 1024,  # base64 в JSON
+    "/statues/recognize-upload": MAX_IMAGE_BYTES + 64 * 1024,  # multipart
+    "/statues/recognize-raw": MAX_IMAGE_BYTES,
+    "/statues/recognize-batch": MAX_BATCH_BYTES,
+}
+
 @router.get("/health")
 async def statue_health_check():
-    """Проверка состояния модуля распознавания статуй"""
+    """Проверка состояния модуля распознавания статуй и статистика по версиям модели"""
+    recognizer = model_registry.active
     return {
-        "model_loaded": statue_recognizer.is_loaded,
-        "available_classes": list(statue_recognizer.russian_names.values()) if statue_recognizer.is_loaded else [],
-        "status": "active" if statue_recognizer.is_loaded else "model_not_loaded"
+        "model_loaded": recognizer is not None,
+        "available_classes": list(recognizer.russian_names.values()) if recognizer is not None else [],
+        "status": "active" if recognizer is not None else "model_not_loaded",
+        "state": model_registry.state,
+        "model_version": recognizer.model_version if recognizer is not None else None,
+        "models": model_registry.stats(),
+        "inference": {
+            **recognition_scheduler.stats.as_dict(),
+            "queue_size": recognition_scheduler.queue_size(),
+            "max_queue": INFERENCE_CONFIG["max_queue"],
+            "workers": INFERENCE_CONFIG["workers"],
+        },
+        "cache": recognition_cache.stats(),
+        "near_duplicates": near_duplicate_index.stats() if near_duplicate_index is not None else None
     }
 
+@router.get("/ready")
+async def statue_readiness():
+    """Для балансировщика: 200 только когда модель загружена и прогрета"""
+    if not model_registry.is_loaded:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Модель не готова: {model_registry.state}",
+            headers={"Retry-After": "5"},
+        )
+    return {"state": model_registry.state}
+
 @router.post("/recognize", response_model=RecognitionResponse)
-async def recognize_statue(request: RecognitionRequest):
+async def recognize_statue(request: RecognitionRequest,
+                           x_model_version: Optional[str] = Header(None)):
     """Распознавание статуи по изображению в base64"""
     try:
         print("📨 Received statue recognition request")
@@ -25,11 +67,13 @@ async def recognize_statue(request: RecognitionRequest):
         image_data = base64.b64decode(request.image)
         
         # Распознаем
-        result = statue_recognizer.predict(image_data)
+        result = await recognition_scheduler.predict(image_data, x_model_version)
         
         print(f"✅ Recognition result: {result}")
         return RecognitionResponse(**result)
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Recognition error: {str(e)}")
         return RecognitionResponse(
@@ -38,7 +82,8 @@ async def recognize_statue(request: RecognitionRequest):
         )
 
 @router.post("/recognize-upload", response_model=RecognitionResponse)
-async def recognize_statue_upload(file: UploadFile = File(...)):
+async def recognize_statue_upload(file: UploadFile = File(...),
+                                  x_model_version: Optional[str] = Header(None)):
     """Распознавание статуи по загруженному файлу"""
     try:
         print(f"📨 Received file upload: {file.filename}")
@@ -47,10 +92,12 @@ async def recognize_statue_upload(file: UploadFile = File(...)):
         image_data = await file.read()
         
         # Распознаем
-        result = statue_recognizer.predict(image_data)
+        result = await recognition_scheduler.predict(image_data, x_model_version)
         
         return RecognitionResponse(**result)
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ File recognition error: {str(e)}")
         return RecognitionResponse(
@@ -58,13 +105,63 @@ async def recognize_statue_upload(file: UploadFile = File(...)):
             error=f"Ошибка обработки файла: {str(e)}"
         )
 
+@router.post("/recognize-raw", response_model=RecognitionResponse)
+async def recognize_statue_raw(request: Request,
+                               x_model_version: Optional[str] = Header(None)):
+    """
+    Распознавание по телу запроса с изображением (Content-Type: image/jpeg и т.п.).
+    Без base64 и multipart: байты читаются потоком и один раз склеиваются для декодера.
+    """
+    if not request.headers.get("content-type", "").startswith("image/"):
+        raise HTTPException(status_code=415, detail="Ожидается тело с Content-Type image/*")
+    
+    try:
+        chunks = [chunk async for chunk in request.stream()]
+        image_data = b"".join(chunks)
+        
+        result = await recognition_scheduler.predict(image_data, x_model_version)
+        
+        return RecognitionResponse(**result)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Raw recognition error: {str(e)}")
+        return RecognitionResponse(
+            success=False,
+            error=f"Ошибка обработки: {str(e)}"
+        )
+
+@router.post("/recognize-batch", response_model=RecognitionBatchResponse)
+async def recognize_statue_batch(request: RecognitionBatchRequest,
+                                 x_model_version: Optional[str] = Header(None)):
+    """Распознавание нескольких изображений в base64 за один запрос"""
+    if len(request.images) > MAX_BATCH_IMAGES:
+        raise HTTPException(status_code=413, detail=f"Не больше {MAX_BATCH_IMAGES} изображений за запрос")
+    
+    images = []
+    for image in request.images:
+        try:
+            images.append(base64.b64decode(image))
+        except Exception:
+            images.append(b"")
+    
+    results = await recognition_scheduler.predict_many(images, x_model_version)
+    return RecognitionBatchResponse(results=[RecognitionResponse(**result) for result in results])
+
 @router.get("/classes")
-async def get_statue_classes():
-    """Получить список распознаваемых классов"""
-    if not statue_recognizer.is_loaded:
+async def get_statue_classes(request: Request, response: Response):
+    """Получить список распознаваемых классов (активной версии модели)"""
+    recognizer = model_registry.active
+    if recognizer is None:
         raise HTTPException(status_code=503, detail="Модель не загружена")
     
+    etag = make_etag("classes", tuple(recognizer.russian_names.items()))
+    not_modified = conditional(request, response, etag)
+    if not_modified:
+        return not_modified
+    
     return {
-        "classes": statue_recognizer.russian_names,
-        "total": len(statue_recognizer.russian_names)
+        "classes": recognizer.russian_names,
+        "total": len(recognizer.russian_names)
     }
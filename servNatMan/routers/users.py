@@ -1,45 +1,44 @@
-﻿from fastapi import APIRouter, HTTPException, Depends
-import psycopg2
-from database import get_db_connection
+﻿from fastapi import APIRouter, HTTPException, Depends, Request, Response
+import asyncpg
+from database import get_async_db
 from models import UserCreate, UserResponse
-from security import hash_password
+from security import hash_password_async
+from http_cache import make_etag, conditional, table_version
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 @router.get("/", response_model=dict)
-async def get_users(conn = Depends(get_db_connection)):
-    with conn.cursor() as cur:
-        cur.execute("SELECT * FROM users")
-        users = cur.fetchall()
+async def get_users(request: Request, response: Response, conn = Depends(get_async_db)):
+    version, last_modified = await table_version(conn, "users")
+    not_modified = conditional(request, response, make_etag("users", version), last_modified)
+    if not_modified:
+        return not_modified
+
+    rows = await conn.fetch("SELECT * FROM users")
+    users = [dict(row) for row in rows]
     return {"users": users}
 
 @router.post("/", response_model=dict)
-async def create_user(user: UserCreate, conn = Depends(get_db_connection)):
-    with conn.cursor() as cur:
-        try:
-            cur.execute("SELECT id FROM roles WHERE role_name = 'player'")
-            role_result = cur.fetchone()
-            if not role_result:
-                raise HTTPException(status_code=500, detail="Роль 'player' не найдена")
-            
-            role_id = role_result['id']
+async def create_user(user: UserCreate, conn = Depends(get_async_db)):
+    try:
+        role_id = await conn.fetchval("SELECT id FROM roles WHERE role_name = 'player'")
+        if not role_id:
+            raise HTTPException(status_code=500, detail="Роль 'player' не найдена")
 
-            hashed_password = hash_password(user.password)
-            
-            cur.execute("""
-                INSERT INTO users (username, password, role_id, first_name, surname, age, mail, phone_number)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING id
-            """, (user.username, hashed_password, role_id, user.first_name, 
-                  user.surname, user.age, user.mail, user.phone_number))
-            
-            new_user_id = cur.fetchone()['id']
-            conn.commit()
-            return {"message": "Пользователь создан", "user_id": new_user_id}
-            
-        except psycopg2.IntegrityError:
-            conn.rollback()
-            raise HTTPException(status_code=400, detail="Пользователь с таким username/mail/phone уже существует")
-        except Exception as e:
-            conn.rollback()
-            raise HTTPException(status_code=500, detail=f"Ошибка: {str(e)}")
+        hashed_password = await hash_password_async(user.password)
+        
+        new_user_id = await conn.fetchval("""
+            INSERT INTO users (username, password, role_id, first_name, surname, age, mail, phone_number)
+            VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+            RETURNING id
+        """, user.username, hashed_password, role_id, user.first_name, 
+              user.surname, user.age, user.mail, user.phone_number)
+        
+        return {"message": "Пользователь создан", "user_id": new_user_id}
+        
+    except HTTPException:
+        raise
+    except asyncpg.IntegrityConstraintViolationError:
+        raise HTTPException(status_code=400, detail="Пользователь с таким username/mail/phone уже существует")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка: {str(e)}")
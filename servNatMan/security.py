@@ -1,10 +1,26 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
 import bcrypt
+from fastapi import HTTPException
+
+BCRYPT_CONFIG = {
+    "rounds": 12,       # стоимость bcrypt; хэши с другой стоимостью перехэшируются при входе
+    "workers": 4,       # сколько хэшей считается одновременно
+    "max_pending": 64,  # сверх этого запросы сразу получают 503
+}
+
+_executor = ThreadPoolExecutor(
+    max_workers=BCRYPT_CONFIG["workers"],
+    thread_name_prefix="bcrypt",
+)
+_pending = 0
 
 def hash_password(password: str) -> str:
     """
     Хэширует пароль с помощью bcrypt
     """
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=BCRYPT_CONFIG["rounds"])
     hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed.decode('utf-8')
 
@@ -19,3 +35,37 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         )
     except Exception:
         return False
+
+def needs_rehash(hashed_password: str) -> bool:
+    """
+    Проверяет, посчитан ли хэш с текущей стоимостью ($2b$<rounds>$...)
+    """
+    try:
+        rounds = int(hashed_password.split('$')[2])
+    except (IndexError, ValueError):
+        return True
+    return rounds != BCRYPT_CONFIG["rounds"]
+
+async def _run_in_pool(func, *args):
+    """
+    Выполняет bcrypt в отдельном пуле потоков, чтобы не занимать event loop
+    """
+    global _pending
+    if _pending >= BCRYPT_CONFIG["max_pending"]:
+        raise HTTPException(
+            status_code=503,
+            detail="Сервер перегружен, повторите попытку позже",
+            headers={"Retry-After": "1"},
+        )
+
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+    finally:
+        _pending -= 1
+
+async def hash_password_async(password: str) -> str:
+    return await _run_in_pool(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_in_pool(verify_password, plain_password, hashed_password)
@@ -0,0 +1,79 @@
+import hashlib
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from cache import TTLCache
+
+SESSION_CONFIG = {
+    "lifetime": timedelta(days=7),  # срок жизни токена
+    "cache_size": 10000,            # сколько сессий держать в памяти
+    "cache_ttl": 300.0,             # через сколько секунд перепроверять сессию в БД
+}
+
+# Кэш token -> пользователь. Отзыв сессии в другом процессе виден не позже чем через cache_ttl
+session_cache = TTLCache(maxsize=SESSION_CONFIG["cache_size"], ttl=SESSION_CONFIG["cache_ttl"])
+
+
+def _token_hash(token: str) -> str:
+    """В БД храним только хэш токена, чтобы утечка таблицы не давала доступ"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _cache_user(token: str, user: dict):
+    remaining = (user['expires_at'] - datetime.now(timezone.utc)).total_seconds()
+    if remaining > 0:
+        session_cache.set(token, user, ttl=min(remaining, SESSION_CONFIG["cache_ttl"]))
+
+
+async def create_session(conn, user: dict) -> str:
+    """Создает сессию для пользователя и возвращает токен"""
+    token = secrets.token_hex(32)
+    expires_at = await conn.fetchval("""
+        INSERT INTO sessions (token_hash, user_id, expires_at)
+        VALUES ($1, $2, NOW() + $3::interval)
+        RETURNING expires_at
+    """, _token_hash(token), user['id'], SESSION_CONFIG["lifetime"])
+
+    _cache_user(token, {**user, 'expires_at': expires_at})
+    return token
+
+
+async def get_session_user(pool, token: str) -> Optional[dict]:
+    """Пользователь по токену: сначала из кэша, при промахе из БД"""
+    user = session_cache.get(token)
+    if user is not None:
+        return user
+
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow("""
+            SELECT u.id, u.username, u.first_name, u.surname, r.role_name, s.expires_at
+            FROM sessions s
+            JOIN users u ON s.user_id = u.id
+            JOIN roles r ON u.role_id = r.id
+            WHERE s.token_hash = $1 AND s.expires_at > NOW()
+        """, _token_hash(token))
+
+    if not row:
+        return None
+
+    user = {
+        'id': row['id'],
+        'username': row['username'],
+        'first_name': row['first_name'],
+        'surname': row['surname'],
+        'role': row['role_name'],
+        'expires_at': row['expires_at'],
+    }
+    _cache_user(token, user)
+    return user
+
+
+async def revoke_session(conn, token: str):
+    """Удаляет сессию из БД и из кэша"""
+    session_cache.pop(token)
+    await conn.execute("DELETE FROM sessions WHERE token_hash = $1", _token_hash(token))
+
+
+async def purge_expired_sessions(conn):
+    await conn.execute("DELETE FROM sessions WHERE expires_at <= NOW()")
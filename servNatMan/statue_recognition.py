@@ -1,144 +1,239 @@
 # statue_recognition.py
-import tensorflow as tf
 import numpy as np
-from PIL import Image
-import io
+import hashlib
 import json
 import os
+import sys
 import logging
-from typing import Dict, List
+from typing import Dict, List, Optional
+
+# Общий код инференса лежит в CVnatman/statue_inference
+CV_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'CVnatman')
+if CV_DIR not in sys.path:
+    sys.path.append(CV_DIR)
+
+from statue_inference import METADATA_FILE, MODEL_FILES, InferenceCore, WorkerPoolBackend, load_backend, load_catalog
+from near_duplicates import dhash
 
 logger = logging.getLogger(__name__)
 
+# Бэкенд модели: 'keras' (statue_recognition_model.h5) или 'tflite' (int8, см. export_statue_model.py)
+MODEL_BACKEND = "keras"
+
+# Потоки TensorFlow внутри одной операции и между операциями (0 - по умолчанию TF).
+# Применяются до загрузки модели; при нескольких воркерах инференса стоит уменьшить intra_op.
+TF_THREADING_CONFIG = {
+    "intra_op_threads": 0,
+    "inter_op_threads": 0,
+}
+
+# Пул процессов инференса: processes > 0 - модель считается в отдельных процессах
+# с общим mmap файла модели (лучше всего с бэкендом tflite), батчи передаются через
+# разделяемую память. Тогда uvicorn запускается с одним воркером, а workers в
+# INFERENCE_CONFIG ставится не меньше processes, чтобы все процессы были заняты.
+WORKER_POOL_CONFIG = {
+    "processes": 0,             # 0 - модель в процессе сервера
+    "max_batch_size": 16,       # размер дорожки разделяемой памяти
+    "threads_per_process": 1,   # потоков TFLite в каждом процессе
+}
+
+NOT_LOADED_ERROR = 'Модель не загружена. Проверьте наличие файлов модели в папке models.'
+
+# Размеры батчей для прогрева: первый вызов модели с новой формой трассирует граф
+WARMUP_BATCH_SIZES = (1, 16)
+
+def configure_tf_threading():
+    # TensorFlow импортируется только здесь, при загрузке модели, а не при старте сервера
+    import tensorflow as tf
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(TF_THREADING_CONFIG["intra_op_threads"])
+        tf.config.threading.set_inter_op_parallelism_threads(TF_THREADING_CONFIG["inter_op_threads"])
+    except RuntimeError as e:
+        # TensorFlow уже инициализирован, настройки потоков менять поздно
+        logger.warning(f"⚠️ Не удалось настроить потоки TensorFlow: {e}")
+
 class StatueRecognizer:
-    def __init__(self, model_dir: str = "../models"):
-        self.model = None
+    # Состояния: not_loaded -> loading -> warming -> ready (или failed)
+    def __init__(self, model_dir: str = "../models", backend: str = MODEL_BACKEND,
+                 near_duplicates=None):
+        self.backend_name = backend
+        self.near_duplicates = near_duplicates
+        self.core = None
         self.class_names = []
         self.russian_names = {}
+        self.catalog = ()
         self.img_size = (224, 224)
-        self.is_loaded = False
+        self.state = "not_loaded"
+        self.model_version = None
         self.model_dir = model_dir
-        self.load_model()
+        self.version = os.path.basename(os.path.normpath(model_dir))
+    
+    @property
+    def is_loaded(self) -> bool:
+        return self.state == "ready"
+    
+    @property
+    def backend_failed(self) -> Optional[str]:
+        """Причина, по которой бэкенд перестал отвечать (например, упал процесс пула), иначе None"""
+        return getattr(self.core.backend, 'failed', None) if self.core is not None else None
     
-    def load_model(self):
+    def load_model(self) -> bool:
         """Загрузка модели и меток классов"""
+        self.state = "loading"
         try:
-            model_path = os.path.join(self.model_dir, 'statue_recognition_model.h5')
+            model_path = os.path.join(self.model_dir, MODEL_FILES[self.backend_name])
             class_names_path = os.path.join(self.model_dir, 'class_names.json')
             
             logger.info(f"🔍 Поиск модели по пути: {os.path.abspath(model_path)}")
             logger.info(f"🔍 Поиск классов по пути: {os.path.abspath(class_names_path)}")
             
             if not os.path.exists(model_path):
-                logger.error("❌ Модель не найдена. Файл statue_recognition_model.h5 отсутствует.")
-                return
+                logger.error(f"❌ Модель не найдена. Файл {MODEL_FILES[self.backend_name]} отсутствует.")
+                self.state = "failed"
+                return False
             
             if not os.path.exists(class_names_path):
                 logger.error("❌ Файл class_names.json не найден.")
-                return
-            
-            logger.info("🔄 Загрузка модели распознавания статуй...")
-            self.model = tf.keras.models.load_model(model_path)
+                self.state = "failed"
+                return False
+            
+            logger.info(f"🔄 Загрузка модели распознавания статуй (бэкенд {self.backend_name})...")
+            if WORKER_POOL_CONFIG["processes"]:
+                backend = WorkerPoolBackend(
+                    self.model_dir,
+                    self.backend_name,
+                    processes=WORKER_POOL_CONFIG["processes"],
+                    max_batch_size=WORKER_POOL_CONFIG["max_batch_size"],
+                    **self.backend_kwargs(WORKER_POOL_CONFIG["threads_per_process"]),
+                )
+                logger.info(f"🧵 Пул инференса: {WORKER_POOL_CONFIG['processes']} процессов")
+            else:
+                if self.backend_name == 'keras':
+                    configure_tf_threading()
+                backend = load_backend(self.backend_name, self.model_dir)
             
             # Загружаем названия классов
             with open(class_names_path, 'r', encoding='utf-8') as f:
                 self.russian_names = json.load(f)
             self.class_names = list(self.russian_names.keys())
-            
-            self.is_loaded = True
+            # Описания и факты - из statues.json этой версии модели, один раз при загрузке
+            self.catalog = load_catalog(self.model_dir, self.class_names, self.russian_names)
+            self.core = InferenceCore(backend, self.class_names, self.img_size)
+            metadata_path = os.path.join(self.model_dir, METADATA_FILE)
+            version_paths = [model_path, class_names_path]
+            if os.path.exists(metadata_path):
+                version_paths.append(metadata_path)
+            self.model_version = self.compute_model_version(*version_paths)
+            
+            self.state = "warming"
             logger.info(f"✅ Модель загружена. Классы: {list(self.russian_names.values())}")
+            return True
             
         except Exception as e:
             logger.error(f"❌ Ошибка загрузки модели: {e}")
-            self.is_loaded = False
+            self.state = "failed"
+            return False
     
-    def preprocess_image(self, image_data: bytes) -> np.ndarray:
-        """Предобработка изображения"""
+    def warm_up(self):
+        """Прогон синтетических батчей, чтобы первый настоящий запрос не платил за трассировку"""
+        self.state = "warming"
         try:
-            image = Image.open(io.BytesIO(image_data))
-            
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            image = image.resize(self.img_size)
-            image_array = np.array(image, dtype='float32') / 255.0
-            
-            return image_array
-            
+            for batch_size in WARMUP_BATCH_SIZES:
+                batch = np.zeros((batch_size, self.img_size[1], self.img_size[0], 3), dtype=np.float32)
+                outputs = self.core.forward(batch)
+            if outputs.shape[1] != len(self.catalog):
+                logger.warning(f"⚠️ У модели {outputs.shape[1]} выходов, а классов {len(self.catalog)}: "
+                               f"лишние выходы пропускаются")
+            self.state = "ready"
+            logger.info("🔥 Модель прогрета и готова к работе")
         except Exception as e:
-            logger.error(f"❌ Ошибка обработки изображения: {e}")
-            raise
+            logger.error(f"❌ Ошибка прогрева модели: {e}")
+            self.state = "failed"
+    
+    def backend_kwargs(self, threads: int) -> Dict:
+        return {"num_threads": threads} if self.backend_name == 'tflite' else {}
+    
+    def unload(self):
+        """Освобождает модель (вызывается реестром, когда версия больше не нужна)"""
+        if self.core is not None and hasattr(self.core.backend, 'close'):
+            # Процессы пула и разделяемая память освобождаются явно
+            self.core.backend.close()
+        self.core = None
+        self.state = "not_loaded"
+    
+    def compute_model_version(self, *paths) -> str:
+        """Короткий идентификатор версии: меняется при замене файлов модели или классов"""
+        parts = [self.backend_name]
+        for path in paths:
+            stat = os.stat(path)
+            parts.append(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}")
+        return hashlib.sha1("|".join(parts).encode('utf-8')).hexdigest()[:12]
     
     def predict(self, image_data: bytes) -> Dict:
         """Предсказание для изображения"""
+        return self.predict_batch([image_data])[0]
+    
+    def predict_batch(self, images: List[bytes]) -> List[Dict]:
+        """Предсказание для нескольких изображений одним вызовом модели"""
         if not self.is_loaded:
-            return {
-                'success': False,
-                'error': 'Модель не загружена. Проверьте наличие файлов модели в папке models.'
-            }
+            return [{'success': False, 'error': NOT_LOADED_ERROR} for _ in images]
+        
+        results: List[Dict] = [None] * len(images)
+        hashes = [None] * len(images)
+        
+        def should_infer(i, image):
+            """False - почти такое же фото уже распознавали, модель не запускаем"""
+            if self.near_duplicates is None:
+                return True
+            try:
+                image_hash = dhash(image)
+            except Exception as e:
+                # Без хэша это фото просто идет в модель без поиска дублей
+                logger.warning(f"⚠️ Не удалось посчитать dHash: {e}")
+                return True
+            hashes[i] = image_hash
+            cached = self.near_duplicates.lookup(image_hash, self.model_version)
+            if cached is None:
+                return True
+            results[i] = cached
+            return False
         
         try:
-            processed_image = self.preprocess_image(image_data)
-            
-            prediction = self.model.predict(
-                np.array([processed_image]), 
-                verbose=0
-            )
-            
-            # Получаем топ предсказания
-            top_indices = np.argsort(prediction[0])[::-1][:3]  # Топ-3
-            results = []
-            
-            for idx in top_indices:
-                if idx < len(self.class_names):
-                    class_name = self.class_names[idx]
-                    confidence = float(prediction[0][idx])
-                    
-                    # Добавляем описания для разных статуй
-                    description = self.get_statue_description(class_name)
-                    interesting_fact = self.get_interesting_fact(class_name)
-                    
-                    results.append({
-                        'name': self.russian_names.get(class_name, class_name),
-                        'confidence': confidence,
-                        'description': description,
-                        'interesting_fact': interesting_fact
-                    })
-            
-            return {
-                'success': True,
-                'objects': results
-            }
-            
+            predictions = self.core.predict_batch(images, k=3, on_image=should_infer)
         except Exception as e:
             logger.error(f"❌ Ошибка предсказания: {e}")
-            return {
-                'success': False,
-                'error': str(e)
+            return [result or {'success': False, 'error': str(e)} for result in results]
+        
+        for i, prediction in enumerate(predictions):
+            if prediction is None:
+                continue
+            if not prediction['success']:
+                results[i] = {'success': False, 'error': prediction['error']}
+                continue
+            results[i] = {
+                'success': True,
+                'objects': self.postprocess(prediction['top'])
             }
+            if hashes[i] is not None:
+                self.near_duplicates.add(hashes[i], self.model_version, results[i])
+        
+        return results
     
-    def get_statue_description(self, class_name: str) -> str:
-        """Возвращает описание статуи"""
-        descriptions = {
-            'perun': 'Бог-громовержец, верховное божество славянского пантеона. Изображается с секирой или молотом.',
-            'veles': 'Бог скота, богатства и подземного мира. Покровительствует искусствам и торговле.',
-            'mokosh': 'Богиня плодородия, судьбы и ремёсел. Покровительница женщин и урожая.',
-            'dazhdbog': 'Бог солнца и податель благ. Сын Сварога, даритель света и тепла.',
-            'svarog': 'Бог-кузнец, творец мира. Отец многих богов и создатель небесного свода.'
-        }
-        return descriptions.get(class_name, 'Славянское божество')
-    
-    def get_interesting_fact(self, class_name: str) -> str:
-        """Возвращает интересный факт о статуе"""
-        facts = {
-            'perun': 'День Перуна отмечался 20 июля. Его символ - громовой знак, защищающий от злых сил.',
-            'veles': 'Велес считался противником Перуна. Его день - 24 февраля, праздник скота.',
-            'mokosh': 'Мокошь - единственное женское божество в княжеском пантеоне Владимира.',
-            'dazhdbog': 'Даждьбог упоминается в "Слове о полку Игореве" как прародитель русских людей.',
-            'svarog': 'Сварог научил людей ковать металл и создал первые законы семейной жизни.'
-        }
-        return facts.get(class_name, 'Важная часть славянской мифологии и культуры.')
-
-
-# Глобальный экземпляр распознавателя
-statue_recognizer = StatueRecognizer(model_dir="../models")
\ No newline at end of file
+    def postprocess(self, top: List[tuple]) -> List[Dict]:
+        """Топ-3 класса (индекс, уверенность) с описаниями из каталога"""
+        results = []
+        
+        for idx, confidence in top:
+            # У модели может быть больше выходов, чем классов в class_names.json
+            if idx >= len(self.catalog):
+                continue
+            info = self.catalog[idx]
+            results.append({
+                'name': info.name,
+                'confidence': confidence,
+                'description': info.description,
+                'interesting_fact': info.interesting_fact,
+                'mark_id': info.mark_id
+            })
+        
+        return results
@@ -0,0 +1,87 @@
+# test_geo.py
+"""
+Запуск из папки servNatMan:
+    python -m pytest tests
+"""
+import math
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from geo import EARTH_RADIUS_M, bboxes_filter, radius_bbox  # noqa: E402
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """То же расстояние, что HAVERSINE_SQL, в метрах"""
+    h = (math.sin(math.radians(lat2 - lat1) / 2) ** 2 +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
+         math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(h)))
+
+
+def destination(lat, lon, bearing, distance_m):
+    """Точка на расстоянии distance_m от (lat, lon) по азимуту bearing (градусы)"""
+    angle = distance_m / EARTH_RADIUS_M
+    lat1, lon1, theta = math.radians(lat), math.radians(lon), math.radians(bearing)
+    lat2 = math.asin(math.sin(lat1) * math.cos(angle) + math.cos(lat1) * math.sin(angle) * math.cos(theta))
+    lon2 = lon1 + math.atan2(math.sin(theta) * math.sin(angle) * math.cos(lat1),
+                             math.cos(angle) - math.sin(lat1) * math.sin(lat2))
+    lon2 = (math.degrees(lon2) + 540.0) % 360.0 - 180.0
+    return math.degrees(lat2), lon2
+
+
+def contains(bboxes, lat, lon):
+    return any(min_lon <= lon <= max_lon and min_lat <= lat <= max_lat
+               for min_lon, min_lat, max_lon, max_lat in bboxes)
+
+
+@pytest.mark.parametrize('lat, lon, radius_m', [
+    (55.75, 37.62, 10000),
+    (0.0, 0.0, 500),
+    (70.0, 100.0, 300000),
+    (-60.0, -179.99, 5000),
+    (45.0, 179.95, 20000),
+])
+def test_circle_boundary_is_inside_bbox(lat, lon, radius_m):
+    bboxes = radius_bbox(lat, lon, radius_m)
+    for bearing in range(0, 360, 5):
+        point = destination(lat, lon, bearing, radius_m * 0.99995)
+        assert haversine(lat, lon, *point) <= radius_m
+        assert contains(bboxes, *point), (bearing, point, bboxes)
+
+
+def test_point_just_inside_radius_to_the_north():
+    # Прямоугольник по METERS_PER_DEGREE другого радиуса Земли терял такие точки
+    lat, lon = destination(55.75, 37.62, 0, 9999.5)
+    assert contains(radius_bbox(55.75, 37.62, 10000), lat, lon)
+
+
+def test_antimeridian_splits_bbox():
+    bboxes = radius_bbox(0.0, 179.99, 5000)
+    assert len(bboxes) == 2
+    east, west = bboxes
+    assert east[2] == 180.0 and west[0] == -180.0
+    assert contains(bboxes, 0.0, -179.99)
+    assert not contains(bboxes, 0.0, 0.0)
+
+
+def test_circle_over_pole_takes_all_longitudes():
+    bboxes = radius_bbox(89.99, 10.0, 5000)
+    assert bboxes == [(-180.0, bboxes[0][1], 180.0, 90.0)]
+    assert contains(bboxes, 89.995, -170.0)
+
+
+def test_bboxes_filter_numbers_params_across_boxes():
+    sql, params = bboxes_filter([(1, 2, 3, 4), (5, 6, 7, 8)], 3)
+    assert sql.startswith('(') and ' OR ' in sql
+    assert '$3' in sql and '$10' in sql and '$11' not in sql
+    assert params == [1, 2, 3, 4, 5, 6, 7, 8]
+
+
+def test_bboxes_filter_single_box_has_no_or():
+    sql, params = bboxes_filter([(1, 2, 3, 4)], 1)
+    assert ' OR ' not in sql
+    assert params == [1, 2, 3, 4]
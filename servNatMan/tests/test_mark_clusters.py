@@ -0,0 +1,113 @@
+# test_mark_clusters.py
+"""
+Запуск из папки servNatMan:
+    python -m pytest tests
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mark_clusters import ClusterIndex  # noqa: E402
+
+WORLD = (-180.0, -85.0, 180.0, 85.0)
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def fetch(self, query):
+        rows = [{'id': mark_id, 'longitude': lon, 'latitude': lat}
+                for mark_id, (lon, lat) in self.pool.rows.items()]
+        if self.pool.during_fetch is not None:
+            self.pool.during_fetch()
+        return rows
+
+
+class FakePool:
+    """Пул без БД: fetch отдает rows; during_fetch вызывается после чтения снимка"""
+
+    def __init__(self, rows, during_fetch=None):
+        self.rows = dict(rows)
+        self.during_fetch = during_fetch
+        self.fetches = 0
+
+    def acquire(self):
+        pool = self
+
+        class _Acquire:
+            async def __aenter__(self):
+                pool.fetches += 1
+                return FakeConnection(pool)
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Acquire()
+
+
+def make_index(reload_interval=300.0):
+    return ClusterIndex(max_zoom=18, radius_px=60, tile_size=256, reload_interval=reload_interval)
+
+
+def by_mark(clusters):
+    return {cluster['mark_id']: cluster for cluster in clusters}
+
+
+def test_close_marks_form_one_cluster():
+    index = make_index()
+    asyncio.run(index.ensure_loaded(FakePool({1: (37.62, 55.75), 2: (37.6201, 55.7501), 3: (30.3, 59.9)})))
+
+    clusters = by_mark(index.clusters(3, WORLD))
+
+    assert clusters[1]['count'] == 2
+    assert clusters[3]['count'] == 1
+    assert abs(clusters[1]['longitude'] - 37.62005) < 1e-9
+
+
+def test_upsert_and_remove_update_built_levels():
+    index = make_index()
+    asyncio.run(index.ensure_loaded(FakePool({1: (37.62, 55.75), 2: (37.6201, 55.7501)})))
+    assert by_mark(index.clusters(3, WORLD))[1]['count'] == 2
+
+    index.remove(1)
+    assert by_mark(index.clusters(3, WORLD)).keys() == {2}
+
+    index.upsert(2, 30.3, 59.9)
+    index.upsert(5, 37.62, 55.75)
+    clusters = by_mark(index.clusters(3, WORLD))
+    assert clusters.keys() == {2, 5}
+    assert clusters[2]['latitude'] == 59.9
+
+
+def test_clusters_only_inside_bbox():
+    index = make_index()
+    asyncio.run(index.ensure_loaded(FakePool({1: (37.62, 55.75), 2: (-74.0, 40.7)})))
+
+    clusters = index.clusters(5, (30.0, 50.0, 40.0, 60.0))
+
+    assert [cluster['mark_id'] for cluster in clusters] == [1]
+
+
+def test_reload_replays_changes_made_during_fetch():
+    index = make_index(reload_interval=0.0)
+
+    def concurrent_changes():
+        index.upsert(3, 30.3, 59.9)
+        index.remove(1)
+
+    asyncio.run(index.ensure_loaded(FakePool({1: (37.62, 55.75), 2: (-74.0, 40.7)}, concurrent_changes)))
+
+    assert by_mark(index.clusters(3, WORLD)).keys() == {2, 3}
+
+
+def test_loaded_index_skips_reload_until_interval():
+    index = make_index()
+    pool = FakePool({1: (37.62, 55.75)})
+
+    asyncio.run(index.ensure_loaded(pool))
+    asyncio.run(index.ensure_loaded(pool))
+
+    assert pool.fetches == 1
@@ -0,0 +1,71 @@
+# test_near_duplicates.py
+"""
+Запуск из папки servNatMan:
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('PIL')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from near_duplicates import NearDuplicateIndex, _chunk_ranges  # noqa: E402
+
+BASE = 0x0123456789ABCDEF
+
+
+def flip(value, *bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def test_chunk_ranges_cover_all_bits():
+    ranges = _chunk_ranges(5)
+    assert sum(bin(mask).count('1') for _, mask in ranges) == 64
+    assert ranges[0][0] == 0
+
+
+def test_lookup_finds_hash_within_max_distance():
+    index = NearDuplicateIndex(max_distance=4, maxsize=10)
+    index.add(BASE, 'v1', {'name': 'perun'})
+
+    assert index.lookup(flip(BASE, 0, 13, 27, 63), 'v1') == {'name': 'perun'}
+    assert index.lookup(flip(BASE, 0, 13, 27, 41, 63), 'v1') is None
+    assert index.stats()['hits'] == 1 and index.stats()['misses'] == 1
+
+
+def test_lookup_prefers_closest_hash():
+    index = NearDuplicateIndex(max_distance=4, maxsize=10)
+    index.add(flip(BASE, 1, 2, 3), 'v1', {'name': 'far'})
+    index.add(flip(BASE, 1), 'v1', {'name': 'near'})
+
+    assert index.lookup(BASE, 'v1') == {'name': 'near'}
+
+
+def test_versions_are_isolated_and_dropped():
+    index = NearDuplicateIndex(max_distance=4, maxsize=10)
+    index.add(BASE, 'v1', {'name': 'perun'})
+    index.add(BASE, 'v2', {'name': 'veles'})
+
+    assert index.lookup(BASE, 'v2') == {'name': 'veles'}
+    index.drop('v1')
+    assert index.lookup(BASE, 'v1') is None
+    assert index.stats()['versions'] == 1
+    assert len(index) == 1
+
+
+def test_maxsize_evicts_least_recently_used():
+    index = NearDuplicateIndex(max_distance=2, maxsize=2)
+    first, second, third = BASE, ~BASE & (2 ** 64 - 1), 0
+    index.add(first, 'v1', {'name': 'first'})
+    index.add(second, 'v1', {'name': 'second'})
+    index.lookup(first, 'v1')
+    index.add(third, 'v1', {'name': 'third'})
+
+    assert len(index) == 2
+    assert index.lookup(second, 'v1') is None
+    assert index.lookup(first, 'v1') == {'name': 'first'}